@@ -0,0 +1,126 @@
+import tracemalloc
+from dataclasses import dataclass
+
+import pyrage
+import pytest
+
+from yamlcrypt.config import YamlCryptConfig
+from yamlcrypt.logger import logger
+
+STYLES = ("plain", "single", "double", "literal", "folded")
+# Values of a generated document are grouped in mappings of this size
+GROUP_SIZE = 10
+# Peak memory of each benchmark, reported after the timings
+PEAK_MEMORY = {}
+
+
+@dataclass(frozen=True)
+class Shape:
+    """The shape of a generated document and of the config processing it."""
+
+    values: int = 100
+    key_width: int = 8
+    depth: int = 2
+    style: str = "plain"
+    rules: int = 1
+
+    def __str__(self):
+        return (
+            f"values={self.values}-width={self.key_width}-depth={self.depth}"
+            f"-{self.style}-rules={self.rules}"
+        )
+
+
+# Each shape changes one dimension of the default shape
+SHAPES = [
+    Shape(),
+    *(Shape(values=values) for values in (10, 1000)),
+    Shape(key_width=64),
+    *(Shape(depth=depth) for depth in (1, 8)),
+    *(Shape(style=style) for style in STYLES[1:]),
+    *(Shape(rules=rules) for rules in (10, 50)),
+]
+
+
+def scalar(style, index, indent):
+    value = f"secret value {index} " * 3
+    if style == "single":
+        return f"'{value}'"
+    if style == "double":
+        return f'"{value}"'
+    if style in ("literal", "folded"):
+        indicator = "|" if style == "literal" else ">"
+        return f"{indicator}\n{indent}{value}\n{indent}second line {index}"
+    return value
+
+
+def generate_document(shape):
+    """Return a document with shape.values values below secrets, depth mappings deep."""
+    lines = ["secrets:"]
+    for group in range(0, shape.values, GROUP_SIZE):
+        lines.append(f"  group_{group}:")
+        indent = "    "
+        for level in range(1, shape.depth):
+            lines.append(f"{indent}level_{level}:")
+            indent += "  "
+        for index in range(group, min(group + GROUP_SIZE, shape.values)):
+            key = f"key_{index}".ljust(shape.key_width, "x")
+            lines.append(f"{indent}{key}: {scalar(shape.style, index, indent + '  ')}")
+    lines.append("other:\n  not: matched")
+    return "\n".join(lines) + "\n"
+
+
+def generate_config(shape, identity):
+    """Return a config with a rule matching every value and shape.rules - 1 other rules."""
+    path = ".".join(["secrets", "*", *(f"level_{level}" for level in range(1, shape.depth)), "*"])
+    paths = [path] + [f"other_{index}.*.value" for index in range(1, shape.rules)]
+    config = YamlCryptConfig(logger())
+    config.config["identities"]["bench"] = {
+        "public": str(identity.to_public()),
+        "private": str(identity),
+    }
+    config.config["rules"] = [{"yamlpath": path, "recipients": ["bench"]} for path in paths]
+    return config
+
+
+@pytest.fixture(scope="session")
+def identity():
+    return pyrage.x25519.Identity.generate()
+
+
+@pytest.fixture(params=SHAPES, ids=str)
+def shape(request):
+    return request.param
+
+
+@pytest.fixture
+def config(shape, identity):
+    return generate_config(shape, identity)
+
+
+@pytest.fixture
+def measure(benchmark, request):
+    """Benchmark a phase, and record the peak memory of one run in the benchmark extra info."""
+
+    def run(fct, setup=None, rounds=5):
+        args = setup() if setup else ()
+        tracemalloc.start()
+        try:
+            fct(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+            benchmark.extra_info["peak_memory"] = PEAK_MEMORY[request.node.name] = peak
+        finally:
+            tracemalloc.stop()
+        if setup:
+            # Phases changing their input run on a new one each time
+            return benchmark.pedantic(fct, setup=lambda: (setup(), {}), rounds=rounds)
+        return benchmark(fct)
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    if PEAK_MEMORY:
+        terminalreporter.section("peak memory (KiB)")
+        for name, peak in sorted(PEAK_MEMORY.items()):
+            terminalreporter.write_line(f"{name:<60} {peak / 1024:>12.1f}")
@@ -0,0 +1,73 @@
+import pytest
+from conftest import Shape, generate_config, generate_document
+
+from yamlcrypt.logger import logger
+from yamlcrypt.node import YamlCryptNode
+from yamlcrypt.processor import YamlCryptDocument, decrypt_value, encrypt_value
+
+
+def load(shape, config):
+    return YamlCryptDocument(generate_document(shape), 0, config.rules, config, logger())
+
+
+def matched_nodes(document):
+    return list(document.matcher.iterate_nodes(document.yaml_data, document.processor))
+
+
+def test_load(measure, shape, config):
+    text = generate_document(shape)
+    measure(lambda: YamlCryptDocument(text, 0, config.rules, config, logger()))
+
+
+def test_iterate_nodes(measure, shape, config):
+    document = load(shape, config)
+    assert len(matched_nodes(document)) == shape.values
+    measure(lambda: matched_nodes(document))
+
+
+def test_encrypt_document(measure, shape, config):
+    measure(lambda document: document.encrypt(), setup=lambda: (load(shape, config),))
+
+
+def test_decrypt_document(measure, shape, config):
+    encrypted = load(shape, config)
+    encrypted.encrypt()
+    text = encrypted.dump()
+
+    def setup():
+        return (YamlCryptDocument(text, 0, config.rules, config, logger()),)
+
+    measure(lambda document: document.decrypt(), setup=setup)
+
+
+def test_dump(measure, shape, config):
+    document = load(shape, config)
+    document.encrypt()
+    measure(document.dump)
+
+
+@pytest.mark.parametrize("size", [16, 1024, 65536])
+def test_encrypt_value(measure, identity, size):
+    value = "x" * size
+    measure(lambda: encrypt_value(value, [identity.to_public()]))
+
+
+@pytest.mark.parametrize("size", [16, 1024, 65536])
+def test_decrypt_value(measure, identity, size):
+    encrypted = encrypt_value("x" * size, [identity.to_public()])
+    measure(lambda: decrypt_value(encrypted, [identity]))
+
+
+@pytest.mark.parametrize("style", ["plain", "double", "literal"])
+def test_envelope(measure, identity, style):
+    shape = Shape(style=style)
+    document = load(shape, generate_config(shape, identity))
+    nodes = [node for _, node in matched_nodes(document)]
+
+    def round_trip():
+        for node in nodes:
+            YamlCryptNode.from_string(
+                YamlCryptNode.from_node_coordinate(node, document.source).to_string()
+            ).to_rueyaml()
+
+    measure(round_trip)
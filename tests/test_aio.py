@@ -0,0 +1,126 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from test_processor import get_failing_files
+from test_yamlcrypt import copy_test_files, yamlcrypt_args
+
+from yamlcrypt import AsyncYamlCrypt, YamlCryptError
+
+
+def test_encrypt_decrypt_text(tmp_path):
+    args = yamlcrypt_args(tmp_path, [])
+    text = "some:\n  path:\n    with:\n      value: secret\n"
+
+    async def run():
+        yamlcrypt = AsyncYamlCrypt(args.config)
+        encrypted = await yamlcrypt.encrypt(text)
+        assert "YamlCrypt[" in encrypted
+        assert await yamlcrypt.check(encrypted) == []
+        assert await yamlcrypt.check(text.encode("utf-8")) == ["some.path.with.value"]
+        assert await yamlcrypt.decrypt(encrypted.encode("utf-8")) == text
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("executor", [None, ThreadPoolExecutor, ProcessPoolExecutor])
+def test_gather_files(tmp_path, executor):
+    failing = get_failing_files("test_encrypt_decrypt")
+    files = [file for file in copy_test_files(tmp_path) if file.name not in failing]
+    originals = [file.read_text() for file in files]
+    args = yamlcrypt_args(tmp_path, files)
+
+    async def run(executor):
+        yamlcrypt = AsyncYamlCrypt(args.config, executor=executor, concurrency=2)
+        await yamlcrypt.gather("encrypt", files)
+        assert all("YamlCrypt[" in file.read_text() for file in files)
+        assert await yamlcrypt.gather("check", files) == [[]] * len(files)
+        await yamlcrypt.gather("decrypt", files)
+
+    if executor:
+        with executor(max_workers=2) as pool:
+            asyncio.run(run(pool))
+    else:
+        asyncio.run(run(None))
+    assert [file.read_text() for file in files] == originals
+
+
+def test_bounded_concurrency(tmp_path, monkeypatch):
+    args = yamlcrypt_args(tmp_path, [])
+    running = 0
+    peak = 0
+
+    def process(*args):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        return [], args[2], None
+
+    async def run():
+        yamlcrypt = AsyncYamlCrypt(args.config, concurrency=3)
+
+        async def run_in_executor(executor, fct):
+            result = fct()
+            await asyncio.sleep(0.01)
+            nonlocal running
+            running -= 1
+            return result
+
+        monkeypatch.setattr("yamlcrypt.aio.process", process)
+        monkeypatch.setattr(asyncio.get_running_loop(), "run_in_executor", run_in_executor)
+        inputs = [f"value: {index}\n" for index in range(10)]
+        assert await yamlcrypt.gather("decrypt", inputs) == inputs
+
+    asyncio.run(run())
+    assert peak == 3
+
+
+def test_concurrency_across_loops(tmp_path):
+    args = yamlcrypt_args(tmp_path, [])
+    # Created outside of any running loop, used by several ones
+    yamlcrypt = AsyncYamlCrypt(args.config, concurrency=1)
+    inputs = [f"value: {index}\n" for index in range(4)]
+
+    for _ in range(2):
+        assert asyncio.run(yamlcrypt.gather("decrypt", inputs)) == inputs
+
+
+def test_str_input_is_text(tmp_path):
+    args = yamlcrypt_args(tmp_path, [])
+    (tmp_path / "file.yaml").write_text("some:\n  path:\n    with:\n      value: secret\n")
+
+    async def run():
+        yamlcrypt = AsyncYamlCrypt(args.config)
+        # A str naming a file is YAML text, not the file
+        assert await yamlcrypt.check(str(tmp_path / "file.yaml")) == []
+        assert await yamlcrypt.check(tmp_path / "file.yaml") == ["some.path.with.value"]
+        with pytest.raises(TypeError):
+            await yamlcrypt.check(1)
+
+    asyncio.run(run())
+
+
+def test_error(tmp_path):
+    args = yamlcrypt_args(tmp_path, [])
+
+    async def run():
+        yamlcrypt = AsyncYamlCrypt(args.config)
+        with pytest.raises(YamlCryptError) as error:
+            await yamlcrypt.encrypt("some: {\n")
+        assert error.value.args[0] == "Could not load input file"
+        with pytest.raises(ValueError):
+            await yamlcrypt.run("serve", "some: value\n")
+
+    asyncio.run(run())
+
+
+def test_get(tmp_path):
+    args = yamlcrypt_args(tmp_path, [])
+    text = "some:\n  path:\n    with:\n      value: secret\n      other: value\n"
+
+    async def run():
+        yamlcrypt = AsyncYamlCrypt(args.config)
+        encrypted = await yamlcrypt.encrypt(text)
+        assert await yamlcrypt.get(encrypted, "some.path.with.value") == ["secret"]
+
+    asyncio.run(run())
@@ -0,0 +1,105 @@
+import os
+import time
+
+import pyrage
+from ruamel.yaml import YAML
+from test_config import default_test_config
+
+from yamlcrypt.cache import YamlCryptDiskCache, YamlCryptValueCache
+from yamlcrypt.config import YamlCryptConfig
+from yamlcrypt.processor import YamlCryptProcessor
+
+IDENTITIES = [pyrage.x25519.Identity.generate()]
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = YamlCryptValueCache(size=2)
+    cache.set("a", IDENTITIES, "value a")
+    cache.set("b", IDENTITIES, "value b")
+    assert cache.get("a", IDENTITIES) == "value a"
+    cache.set("c", IDENTITIES, "value c")
+
+    assert cache.get("b", IDENTITIES) is None
+    assert cache.get("a", IDENTITIES) == "value a"
+    assert cache.get("c", IDENTITIES) == "value c"
+    assert cache.get("a", [pyrage.x25519.Identity.generate()]) is None
+
+
+def test_disk_cache(tmp_path):
+    cache = YamlCryptValueCache(disk=YamlCryptDiskCache(tmp_path / "cache"))
+    cache.set("a", IDENTITIES, "secret value")
+
+    (entry,) = [path for path in (tmp_path / "cache").iterdir() if path.name != ".lock"]
+    assert b"secret value" not in entry.read_bytes()
+    assert (tmp_path / "cache").stat().st_mode & 0o777 == 0o700
+
+    # Another process only finds the values of its own identities
+    cache = YamlCryptValueCache(disk=YamlCryptDiskCache(tmp_path / "cache"))
+    assert cache.get("a", [pyrage.x25519.Identity.generate()]) is None
+    assert cache.get("a", IDENTITIES) == "secret value"
+
+    entry.write_bytes(b"corrupted" * 10)
+    assert (
+        YamlCryptValueCache(disk=YamlCryptDiskCache(tmp_path / "cache")).get("a", IDENTITIES)
+        is None
+    )
+
+
+def test_unusable_disk_cache_falls_back_to_memory(tmp_path):
+    # A file where the cache directory should be created
+    (tmp_path / "cache").write_text("")
+    disk = YamlCryptDiskCache(tmp_path / "cache")
+    cache = YamlCryptValueCache(disk=disk)
+    cache.set("a", IDENTITIES, "secret value")
+
+    assert disk.disabled
+    assert cache.get("a", IDENTITIES) == "secret value"
+    assert cache.get("b", IDENTITIES) is None
+
+
+def test_disk_cache_ttl(tmp_path):
+    disk = YamlCryptDiskCache(tmp_path / "cache", ttl=60)
+    YamlCryptValueCache(disk=disk).set("a", IDENTITIES, "old value")
+    (entry,) = [path for path in (tmp_path / "cache").iterdir() if path.name != ".lock"]
+    os.utime(entry, (time.time() - 120, time.time() - 120))
+    assert YamlCryptValueCache(disk=disk).get("a", IDENTITIES) is None
+
+    # Expired entries are removed by the next writer
+    disk = YamlCryptDiskCache(tmp_path / "cache", ttl=60)
+    YamlCryptValueCache(disk=disk).set("b", IDENTITIES, "value")
+    assert not entry.exists()
+
+
+def test_decrypt_uses_cache(tmp_path, monkeypatch):
+    yaml = YAML(typ="safe")
+    config = yaml.load(default_test_config())
+    config["yamlcrypt"]["cache"] = {"dir": str(tmp_path / "cache")}
+    with (tmp_path / "config.yaml").open("w", encoding="utf-8") as f:
+        yaml.dump(config, f)
+    text = "some:\n  path:\n    with:\n      value: secret\n      other: value\n"
+    encrypted = YamlCryptProcessor.from_string(
+        text, YamlCryptConfig().load(tmp_path / "config.yaml")
+    ).encrypt()
+
+    decrypted = []
+    decrypt = pyrage.decrypt
+    monkeypatch.setattr(pyrage, "decrypt", lambda *args: decrypted.append(args) or decrypt(*args))
+    for _ in range(2):
+        config = YamlCryptConfig().load(tmp_path / "config.yaml")
+        for _ in range(2):
+            assert YamlCryptProcessor.from_string(encrypted, config).decrypt() == text
+    assert len(decrypted) == 2
+
+
+def test_cache_config():
+    config = YamlCryptConfig()
+    assert config.cache is None
+    config.config["cache"] = True
+    assert config.cache.size == 1024
+    assert config.cache.disk is None
+
+    config = YamlCryptConfig()
+    config.config["cache"] = {"size": 10, "dir": "~/cache", "ttl": 60}
+    assert config.cache.size == 10
+    assert str(config.cache.disk.path) == os.path.expanduser("~/cache")
+    assert config.cache.disk.ttl == 60
@@ -1,12 +1,14 @@
 import contextlib
 import os
 from pathlib import Path
+from types import SimpleNamespace
 
 import pyrage
 import pytest
 from ruamel.yaml import YAML
 
 from yamlcrypt import (
+    YamlCrypt,
     YamlCryptConfig,
     YamlCryptConfigNotFoundError,
     YamlCryptDuplicateIdentify,
@@ -283,6 +285,23 @@ def test_config_no_public(tmp_path):
     assert str(config.identity("bla")) == private
 
 
+def test_preload_missing_private_file(tmp_path):
+    yaml = YAML(typ="safe")
+
+    test_config = yaml.load(default_test_config())
+    test_config["yamlcrypt"]["identities"]["bla"]["private"] = {
+        "file": str(tmp_path / "missing.key")
+    }
+    with (tmp_path / "config.yaml").open("w", encoding="utf-8") as f:
+        yaml.dump(test_config, f)
+
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    # Only reported when a value has to be decrypted
+    config.preload_keys()
+    with pytest.raises(OSError):
+        config.identity("bla")
+
+
 def test_config_no_private(tmp_path):
     yaml = YAML(typ="safe")
 
@@ -327,3 +346,57 @@ def test_config_no_private_no_public(tmp_path):
         config.identity("bla")
     assert error.value.args[0] == "Could not find identity config"
     assert error.value.args[1] == "bla"
+
+
+@pytest.mark.parametrize(
+    "rule,message",
+    [
+        ({"yamlpath": "some.path"}, "Rules need a yamlpath and recipients"),
+        ({"yamlpath": "some.[bad", "recipients": ["bla"]}, "Invalid yamlpath in rule"),
+        ({"yamlpath": "some.path", "recipients": ["unknown"]}, "Unknown recipient in rule"),
+        (
+            {"yamlpath": "some.path", "recipients": ["bla"], "files": "*.yaml"},
+            "Rule files should be a list of patterns",
+        ),
+    ],
+)
+def test_invalid_rule(tmp_path, rule, message):
+    yaml = YAML(typ="safe")
+
+    test_config = yaml.load(default_test_config())
+    test_config["yamlcrypt"]["rules"].append(rule)
+    with (tmp_path / "config.yaml").open("w", encoding="utf-8") as f:
+        yaml.dump(test_config, f)
+
+    with pytest.raises(YamlCryptError) as error:
+        YamlCryptConfig().load(tmp_path / "config.yaml")
+    assert error.value.args[0] == message
+
+
+def test_recipient_add_referenced_by_rule(tmp_path):
+    yaml = YAML(typ="safe")
+    test_config = yaml.load(default_test_config())
+    test_config["yamlcrypt"]["rules"].append({"yamlpath": "other", "recipients": ["admin"]})
+    with (tmp_path / "config.yaml").open("w", encoding="utf-8") as f:
+        yaml.dump(test_config, f)
+    args = SimpleNamespace(config=tmp_path / "config.yaml", recipient="admin", key_file=None)
+
+    YamlCrypt(args).recipient_add()
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    assert "admin" in config.config["identities"]
+
+
+def test_compiled_rules(tmp_path):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    (rule,) = config.rules
+    assert config.rules is config.rules
+    assert rule.prefix == "YamlCrypt["
+    assert rule.top_level_key == "some"
+    assert rule.keys == ("some", "path", "with", None)
+    assert rule.recipients == ("bla",)
+    assert config.rule_recipients(rule) is config.rule_recipients(rule)
+    assert [str(recipient) for recipient in config.rule_recipients(rule)] == [
+        str(config.recipient("bla"))
+    ]
@@ -0,0 +1,69 @@
+import json
+import subprocess
+
+import pytest
+
+from yamlcrypt.errors import YamlCryptError
+from yamlcrypt.export import (
+    EXPORT_JSON,
+    EXPORT_SHELL,
+    add_values,
+    format_export,
+    variable_name,
+)
+
+VALUES = {
+    "some.path.with.value": "secret",
+    "some.path.with.multi-line": 'it\'s "quoted"\nand $HOME\tescaped\\',
+    "list[0]": "",
+}
+
+
+def test_variable_name():
+    assert variable_name("some.path.with.value") == "SOME_PATH_WITH_VALUE"
+    assert variable_name("/some/path/with-dash") == "SOME_PATH_WITH_DASH"
+    assert variable_name("list[0]") == "LIST_0"
+    assert variable_name("0.key") == "_0_KEY"
+    assert variable_name("value", prefix="app_") == "APP_VALUE"
+
+
+def test_dotenv():
+    assert format_export(VALUES) == "\n".join(
+        [
+            "SOME_PATH_WITH_VALUE=secret",
+            'SOME_PATH_WITH_MULTI_LINE="it\'s \\"quoted\\"\\nand \\$HOME\\tescaped\\\\"',
+            "LIST_0=",
+        ]
+    )
+
+
+def test_dotenv_dollar():
+    # Single quoted values are not interpolated
+    assert format_export({"value": "pa$$word"}) == "VALUE='pa$$word'"
+    assert format_export({"value": "it's $HOME"}) == 'VALUE="it\'s \\$HOME"'
+
+
+def test_shell():
+    script = format_export(VALUES, EXPORT_SHELL, prefix="app.")
+    output = subprocess.run(
+        ["sh", "-c", f'{script}\nprintf "%s" "$APP_SOME_PATH_WITH_MULTI_LINE"'],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert output == VALUES["some.path.with.multi-line"]
+
+
+def test_json():
+    assert json.loads(format_export(VALUES, EXPORT_JSON)) == VALUES
+
+
+def test_duplicate_paths():
+    values = add_values({}, [("some.value", "a")])
+    with pytest.raises(YamlCryptError, match="exported more than once"):
+        add_values(values, [("other.value", "b"), ("some.value", "c")])
+
+
+def test_conflicting_names():
+    with pytest.raises(YamlCryptError, match="same variable name"):
+        format_export({"some.value": "a", "some-value": "b"})
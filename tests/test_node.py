@@ -0,0 +1,42 @@
+import pytest
+from ruamel.yaml.scalarstring import FoldedScalarString
+
+from yamlcrypt.errors import YamlCryptError
+from yamlcrypt.node import YamlCryptNode, get_yaml
+
+
+@pytest.mark.parametrize(
+    "node",
+    [
+        YamlCryptNode(style=None, data="plain"),
+        YamlCryptNode(style="'", data="it''s"),
+        YamlCryptNode(style='"', data="escaped \\n and unicode é"),
+        YamlCryptNode(style="|", data="line 1\nline 2\n"),
+        YamlCryptNode(style=">", data="folded\nvalue\n", fold_pos=[6]),
+    ],
+)
+def test_envelope_round_trip(node):
+    data = node.to_string()
+    assert data.startswith("{")
+
+    decoded = YamlCryptNode.from_string(data)
+    assert decoded.style == node.style
+    assert decoded.data == node.data
+    assert decoded.fold_pos == node.fold_pos
+
+
+def test_legacy_envelope():
+    legacy = get_yaml().dump_to_string({"s": ">", "d": "folded\nvalue\n", "f": [6]})
+
+    decoded = YamlCryptNode.from_string(legacy)
+    assert decoded.style == ">"
+    assert decoded.data == "folded\nvalue\n"
+    assert decoded.fold_pos == [6]
+    assert isinstance(decoded.to_rueyaml(), FoldedScalarString)
+
+
+def test_unsupported_envelope_version():
+    with pytest.raises(YamlCryptError) as error:
+        YamlCryptNode.from_string('{"v":99,"s":null,"d":"value"}')
+    assert error.value.args[0] == "Unsupported value envelope version"
+    assert error.value.args[1] == 99
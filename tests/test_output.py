@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from yamlcrypt.output import FSYNC_POLICIES, YamlCryptOutput
+
+
+def write(path, data, fsync="file"):
+    with YamlCryptOutput(path, fsync=fsync) as output:
+        output.write(data, changed=True)
+
+
+@pytest.mark.parametrize("fsync", FSYNC_POLICIES)
+def test_output_replaces_file(tmp_path, fsync):
+    path = tmp_path / "file.yaml"
+    path.write_text("old: value\n")
+    path.chmod(0o600)
+
+    write(path, "new: value\n", fsync=fsync)
+    assert path.read_text() == "new: value\n"
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_output_skips_identical_content(tmp_path):
+    path = tmp_path / "file.yaml"
+    path.write_text("same: value\n")
+    os.utime(path, ns=(0, 0))
+    inode = path.stat().st_ino
+
+    write(path, "same: value\n")
+    assert path.stat().st_mtime_ns == 0
+    assert path.stat().st_ino == inode
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_output_keeps_file_on_error(tmp_path):
+    path = tmp_path / "file.yaml"
+    path.write_text("old: value\n")
+
+    with pytest.raises(ValueError), YamlCryptOutput(path) as output:
+        output.write("new: ", changed=True)
+        raise ValueError()
+    assert path.read_text() == "old: value\n"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_output_writes_through_symlink(tmp_path):
+    (tmp_path / "target").mkdir()
+    target = tmp_path / "target" / "file.yaml"
+    target.write_text("old: value\n")
+    link = tmp_path / "link.yaml"
+    link.symlink_to(target)
+
+    write(link, "new: value\n")
+    assert link.is_symlink()
+    assert target.read_text() == "new: value\n"
+    assert sorted(tmp_path.iterdir()) == [link, tmp_path / "target"]
+    assert list((tmp_path / "target").iterdir()) == [target]
@@ -1,12 +1,24 @@
 from pathlib import Path
 
+import pyrage
 import pytest
 from ruamel.yaml import YAML
 from test_config import customized_env, default_test_config
+from yamlpath import Processor as YAMLProcessor
+from yamlpath import YAMLPath
+from yamlpath.common import Parsers
+from yamlpath.exceptions import YAMLPathException
 
-from yamlcrypt.config import YamlCryptConfig
+from yamlcrypt.config import YamlCryptConfig, YamlCryptRule
 from yamlcrypt.errors import YamlCryptError
-from yamlcrypt.processor import YamlCryptProcessor, YamlCryptProcessorArgs
+from yamlcrypt.filekey import FILE_KEYS_FIELD, YamlCryptFileKeys
+from yamlcrypt.logger import logger
+from yamlcrypt.processor import (
+    YamlCryptMatcher,
+    YamlCryptProcessor,
+    YamlCryptProcessorArgs,
+    may_match,
+)
 
 TEST_DATA_PATH = Path(__file__).parent / "data"
 
@@ -250,3 +262,559 @@ def test_config_no_private_no_public(tmp_path):
         ).encrypt()
     assert error.value.args[0] == "Could not find identity config"
     assert error.value.args[1] == "bla"
+
+
+def test_file_key(tmp_path):
+    yaml = YAML(typ="safe")
+    test_path = TEST_DATA_PATH / "test_encrypt_decrypt" / "all.yaml"
+
+    config = yaml.load(default_test_config())
+    config["yamlcrypt"]["rules"][0]["file_key"] = True
+    encryt_decrypt(tmp_path=tmp_path, config=config, test_path=test_path)
+
+    encrypted = yaml.load((tmp_path / "encrypted.yaml").read_text())
+    assert len(encrypted["_yamlcrypt_keys"]) == 1
+    key_id = next(iter(encrypted["_yamlcrypt_keys"]))
+    for value in encrypted["some"]["path"]["with"].values():
+        assert value.startswith(f"YamlCrypt[@{key_id}:")
+
+    assert (tmp_path / "decrypted.yaml").read_text() == (
+        TEST_DATA_PATH / "test_encrypt_decrypt" / "failing" / "all.yaml"
+    ).read_text()
+
+
+def test_file_key_reencrypt_keeps_existing_values(tmp_path):
+    yaml = YAML(typ="safe")
+    test_path = TEST_DATA_PATH / "test_encrypt_decrypt" / "all.yaml"
+
+    config = yaml.load(default_test_config())
+    config["yamlcrypt"]["rules"][0]["file_key"] = True
+    encryt_decrypt(tmp_path=tmp_path, config=config, test_path=test_path)
+
+    encrypted = (tmp_path / "encrypted.yaml").read_text()
+    (tmp_path / "partial.yaml").write_text(
+        encrypted.replace("_yamlcrypt_keys:", "      Added: new value\n_yamlcrypt_keys:")
+    )
+    YamlCryptProcessor(
+        args=YamlCryptProcessorArgs(input=tmp_path / "partial.yaml"),
+        config=YamlCryptConfig().load(tmp_path / "config.yaml"),
+    ).encrypt()
+    partial = yaml.load((tmp_path / "partial.yaml").read_text())
+    assert len(partial["_yamlcrypt_keys"]) == 2
+
+    YamlCryptProcessor(
+        args=YamlCryptProcessorArgs(input=tmp_path / "partial.yaml"),
+        config=YamlCryptConfig().load(tmp_path / "config.yaml"),
+    ).decrypt()
+    decrypted = yaml.load((tmp_path / "partial.yaml").read_text())
+    assert "_yamlcrypt_keys" not in decrypted
+    assert decrypted["some"]["path"]["with"]["Added"] == "new value"
+    assert decrypted["some"]["path"]["with"]["PlainScalarString"] == (
+        "This is a plain scalar string."
+    )
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        # The rule is scoped to other files
+        lambda rule: rule.update(files=["other/*.yaml"]),
+        # The rule is replaced by one matching no value
+        lambda rule: rule.update(yamlpath="missing.*"),
+    ],
+)
+@pytest.mark.parametrize("command", ["encrypt", "decrypt"])
+def test_file_key_kept_for_unmatched_values(tmp_path, change, command):
+    yaml = YAML(typ="safe")
+    config = yaml.load(default_test_config())
+    config["yamlcrypt"]["rules"][0]["file_key"] = True
+    # Still applies, so the document is processed
+    config["yamlcrypt"]["rules"].append({"yamlpath": "other.*", "recipients": ["bla"]})
+    yaml.dump(config, tmp_path / "config.yaml")
+    text = "some:\n  path:\n    with:\n      value: secret\nother:\n  value: other\n"
+    encrypted = YamlCryptProcessor.from_string(
+        text, YamlCryptConfig().load(tmp_path / "config.yaml")
+    ).encrypt()
+
+    change(config["yamlcrypt"]["rules"][0])
+    yaml.dump(config, tmp_path / "changed.yaml")
+    processed = getattr(
+        YamlCryptProcessor.from_string(
+            encrypted, YamlCryptConfig().load(tmp_path / "changed.yaml"), path="file.yaml"
+        ),
+        command,
+    )()
+    # The value matched by the previous rule can still be decrypted
+    assert yaml.load(processed)["some"]["path"]["with"]["value"].startswith("YamlCrypt[@")
+    decrypted = YamlCryptProcessor.from_string(
+        processed, YamlCryptConfig().load(tmp_path / "config.yaml")
+    ).decrypt()
+    assert yaml.load(decrypted)["some"]["path"]["with"]["value"] == "secret"
+
+
+def test_file_key_id_is_not_reused(monkeypatch):
+    data = {FILE_KEYS_FIELD: {"00000000": "stored"}}
+    ids = iter(["00000000", "00000001"])
+    monkeypatch.setattr("yamlcrypt.filekey.secrets.token_hex", lambda size: next(ids))
+    identity = pyrage.x25519.Identity.generate()
+
+    key_id, _ = YamlCryptFileKeys(data).new_key(("bla",), [identity.to_public()])
+    assert key_id == "00000001"
+
+
+@pytest.mark.parametrize("file_key", [False, True])
+def test_sidecar_reuses_unchanged_values(tmp_path, file_key):
+    yaml = YAML(typ="safe")
+    test_path = TEST_DATA_PATH / "test_encrypt_decrypt" / "all.yaml"
+
+    config = yaml.load(default_test_config())
+    config["yamlcrypt"]["sidecar"] = True
+    config["yamlcrypt"]["rules"][0]["file_key"] = file_key
+    encryt_decrypt(tmp_path=tmp_path, config=config, test_path=test_path)
+    assert (tmp_path / ".decrypted.yaml.yamlcrypt").is_file()
+
+    decrypted = (tmp_path / "decrypted.yaml").read_text()
+    (tmp_path / "decrypted.yaml").write_text(
+        decrypted.replace("This is a plain scalar string.", "This is a changed string.")
+    )
+    YamlCryptProcessor(
+        args=YamlCryptProcessorArgs(input=tmp_path / "decrypted.yaml"),
+        config=YamlCryptConfig().load(tmp_path / "config.yaml"),
+    ).encrypt()
+    assert not (tmp_path / ".decrypted.yaml.yamlcrypt").exists()
+
+    before = yaml.load((tmp_path / "encrypted.yaml").read_text())
+    after = yaml.load((tmp_path / "decrypted.yaml").read_text())
+    changed = [
+        key
+        for key, value in after["some"]["path"]["with"].items()
+        if value != before["some"]["path"]["with"][key]
+    ]
+    assert "PlainScalarString" in changed
+    assert "LiteralScalarString" not in changed
+    assert "FoldedScalarString_Keep" not in changed
+    if file_key:
+        assert len(after["_yamlcrypt_keys"]) == 2
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("some:\n  path: value\n", True),
+        ("---\n# comment\n'some': {path: value}\n", True),
+        ("other:\n  some: value\n", False),
+        ("other: 1\n...\n---\nsome: 2\n", True),
+        ("", False),
+        ("{some: value}\n", True),
+        ("--- {other: value}\n", True),
+        ("  some: value\n", True),
+        ("- some\n", True),
+        ("\ufeffsome:\n  path: value\n", True),
+        ("'it''s': 1\nsome:\n  path: value\n", True),
+        ("'it''s': 1\nother: 2\n", False),
+        ('"a\\"b": 1\nother: 2\n', True),
+        ("a:b: 1\nother: 2\n", False),
+        ("a:b: 1\nsome:\n  path: value\n", True),
+        ("some:b: 1\n", False),
+        ("other #comment: 1\n", True),
+        ("multi line\n", True),
+    ],
+)
+def test_may_match(text, expected):
+    config = YamlCryptConfig().add_recipient("bla")
+    config.config["rules"] = [{"yamlpath": "some.path", "recipients": ["bla"]}]
+    assert may_match(text, list(config.iterate_rules())) is expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "\ufeffsome:\n  path:\n    with:\n      pw: hunter2\n",
+        "'it''s': 1\nsome:\n  path:\n    with:\n      pw: hunter2\n",
+        '"a\\"b": 1\nsome:\n  path:\n    with:\n      pw: hunter2\n',
+        "a:b: 1\nsome:\n  path:\n    with:\n      pw: hunter2\n",
+    ],
+)
+def test_may_match_is_not_fooled(tmp_path, text):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+
+    encrypted = YamlCryptProcessor.from_string(text, config).encrypt()
+    assert "hunter2" not in encrypted
+    assert YamlCryptProcessor.from_string(text, config).check() == ["some.path.with.pw"]
+
+
+def test_may_match_unknown_root_key():
+    config = YamlCryptConfig().add_recipient("bla")
+    config.config["rules"] = [{"yamlpath": "*.path", "recipients": ["bla"]}]
+    assert may_match("other: value\n", list(config.iterate_rules()))
+
+
+def test_rule_files(tmp_path):
+    yaml = YAML(typ="safe")
+    config = yaml.load(default_test_config())
+    config["yamlcrypt"]["rules"][0]["files"] = ["*.secrets.yaml"]
+    with (tmp_path / "config.yaml").open("w", encoding="utf-8") as f:
+        yaml.dump(config, f)
+
+    test_path = TEST_DATA_PATH / "test_encrypt_decrypt" / "all.yaml"
+    for name in ["all.yaml", "all.secrets.yaml"]:
+        (tmp_path / name).write_text(test_path.read_text())
+        YamlCryptProcessor(
+            args=YamlCryptProcessorArgs(input=tmp_path / name),
+            config=YamlCryptConfig().load(tmp_path / "config.yaml"),
+        ).encrypt()
+
+    assert (tmp_path / "all.yaml").read_text() == test_path.read_text()
+    assert "YamlCrypt[" in (tmp_path / "all.secrets.yaml").read_text()
+
+
+def test_quoted_scalar_last_in_document(tmp_path):
+    yaml = YAML(typ="safe")
+    test_path = tmp_path / "last.yaml"
+    test_path.write_text("---\nsome:\n  path:\n    with:\n      quoted: 'last value'\n")
+
+    encryt_decrypt(tmp_path=tmp_path, config=yaml.load(default_test_config()), test_path=test_path)
+    assert (tmp_path / "decrypted.yaml").read_text() == test_path.read_text()
+
+
+def test_multiple_documents(tmp_path):
+    yaml = YAML(typ="safe")
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    untouched = "---\n# Not matched\nother:   {a: 1,   b: 2}\n"
+    test_path = tmp_path / "bundle.yaml"
+    test_path.write_text(
+        "---\nsome:\n  path:\n    with:\n      first: value 1\n"
+        + untouched
+        + "---\nsome:\n  path:\n    with:\n      second: value 2\n"
+    )
+
+    YamlCryptProcessor(
+        args=YamlCryptProcessorArgs(input=test_path, output=tmp_path / "encrypted.yaml"),
+        config=YamlCryptConfig().load(tmp_path / "config.yaml"),
+    ).encrypt()
+    encrypted = (tmp_path / "encrypted.yaml").read_text()
+    assert untouched in encrypted
+    documents = list(yaml.load_all(encrypted))
+    assert documents[0]["some"]["path"]["with"]["first"].startswith("YamlCrypt[")
+    assert documents[2]["some"]["path"]["with"]["second"].startswith("YamlCrypt[")
+
+    (tmp_path / "encrypted.yaml").write_text(
+        encrypted + "---\nsome: {path: {with: {third: value 3}}}\n"
+    )
+    assert YamlCryptProcessor(
+        args=YamlCryptProcessorArgs(input=tmp_path / "encrypted.yaml"),
+        config=YamlCryptConfig().load(tmp_path / "config.yaml"),
+    ).check() == ["some.path.with.third (document 4)"]
+
+    (tmp_path / "encrypted.yaml").write_text(encrypted)
+    YamlCryptProcessor(
+        args=YamlCryptProcessorArgs(
+            input=tmp_path / "encrypted.yaml", output=tmp_path / "decrypted.yaml"
+        ),
+        config=YamlCryptConfig().load(tmp_path / "config.yaml"),
+    ).decrypt()
+    assert (tmp_path / "decrypted.yaml").read_text() == test_path.read_text()
+
+
+def splice_encrypt_decrypt(tmp_path, test_path):
+    for command, input, output in [
+        ("encrypt", test_path, tmp_path / "encrypted.yaml"),
+        ("decrypt", tmp_path / "encrypted.yaml", tmp_path / "decrypted.yaml"),
+    ]:
+        getattr(
+            YamlCryptProcessor(
+                args=YamlCryptProcessorArgs(input=input, output=output, splice=True),
+                config=YamlCryptConfig().load(tmp_path / "config.yaml"),
+            ),
+            command,
+        )()
+
+
+@pytest.mark.parametrize("test_file", get_working_files("test_encrypt_decrypt"))
+def test_splice_encrypt_decrypt(tmp_path, test_file):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    test_path = TEST_DATA_PATH / "test_encrypt_decrypt" / test_file
+
+    splice_encrypt_decrypt(tmp_path, test_path)
+    assert (tmp_path / "decrypted.yaml").read_text() == test_path.read_text()
+
+
+def test_splice_keeps_unchanged_text(tmp_path):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    head = "other:   {a: 1,   b: [x,y]}   # kept as is\nsome:\n  path:\n    with:\n"
+    tail = "\n    # Comment\n    other:  'not matched'\n"
+    test_path = tmp_path / "splice.yaml"
+    test_path.write_text(head + '      quoted:   "value 1"\n      plain:   value 2\n' + tail)
+
+    splice_encrypt_decrypt(tmp_path, test_path)
+    encrypted = (tmp_path / "encrypted.yaml").read_text()
+    assert encrypted.startswith(head + "      quoted:   |-\n        YamlCrypt[")
+    assert encrypted.endswith("]\n" + tail)
+    assert (tmp_path / "decrypted.yaml").read_text() == test_path.read_text()
+
+
+def test_splice_crlf(tmp_path):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    head = "top: 1\r\nsome:\r\n  path:\r\n    with:\r\n"
+    tail = "\r\n      b: |\r\n        multi\r\n\r\n        line\r\nz: 2\r\n"
+    text = head + "      a: plain" + tail
+
+    encrypted = YamlCryptProcessor.from_string(text, config, splice=True).encrypt()
+    assert encrypted.startswith(head + "      a: |-\r\n        YamlCrypt[")
+    assert encrypted.endswith("]\r\nz: 2\r\n")
+    # Every line ends with CRLF
+    assert encrypted.count("\n") == encrypted.count("\r\n")
+    decrypted = YamlCryptProcessor.from_string(encrypted, config, splice=True).decrypt()
+    assert decrypted == text
+
+
+def test_splice_falls_back_to_dump(tmp_path):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    test_path = tmp_path / "flow.yaml"
+    test_path.write_text("some:\n  path:\n    with: {flow:   value}\nother:   1\n")
+
+    splice_encrypt_decrypt(tmp_path, test_path)
+    assert "other: 1\n" in (tmp_path / "encrypted.yaml").read_text()
+
+
+MATCHER_DOCUMENT = """\
+a:
+  x:
+    b: 1
+  y:
+    c: 2
+  "k.e y": 3
+  0: zero
+list:
+  - b: 4
+  - 5
+"""
+
+
+@pytest.mark.parametrize(
+    "yaml_path",
+    [
+        "a.*.b",
+        "a.*",
+        "a.0",
+        "a.x.b",
+        "a.x.b.c",
+        "*",
+        "*.*",
+        "list.*",
+        "list.1",
+        "list.b",
+        "list[0].b",
+    ],
+)
+def test_matcher_matches_yamlpath(yaml_path):
+    yaml = Parsers.get_yaml_editor()
+    yaml_data, _ = Parsers.get_yaml_data(yaml, logger(), MATCHER_DOCUMENT, literal=True)
+    processor = YAMLProcessor(logger(), yaml_data)
+    try:
+        expected = list(processor.get_nodes(yaml_path, mustexist=True))
+    except YAMLPathException:
+        expected = []
+
+    rule = YamlCryptRule(yaml_path=YAMLPath(yaml_path), markup="YamlCrypt", recipients=("bla",))
+    matched = [node for _, node in YamlCryptMatcher([rule]).iterate_nodes(yaml_data, processor)]
+    assert [(str(node.path), node.node, node.parentref) for node in matched] == [
+        (str(node.path), node.node, node.parentref) for node in expected
+    ]
+    assert [node.ancestry for node in matched] == [node.ancestry for node in expected]
+
+
+def test_matcher_first_rule_wins():
+    yaml = Parsers.get_yaml_editor()
+    yaml_data, _ = Parsers.get_yaml_data(yaml, logger(), MATCHER_DOCUMENT, literal=True)
+    processor = YAMLProcessor(logger(), yaml_data)
+    rules = [
+        YamlCryptRule(yaml_path=YAMLPath(path), markup=markup, recipients=("bla",))
+        for path, markup in [("a.x[.=~/./]", "First"), ("a.x.b", "Second"), ("a.*.c", "Third")]
+    ]
+
+    matched = YamlCryptMatcher(rules).iterate_nodes(yaml_data, processor)
+    assert sorted((str(node.path), rule.markup) for rule, node in matched) == [
+        ("a.x.b", "First"),
+        ("a.y.c", "Third"),
+    ]
+
+
+@pytest.mark.parametrize("text", ["some:\n  other: value\n", "some:\n  path: value\n"])
+def test_missing_path_is_not_created(tmp_path, text):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    test_path = tmp_path / "missing.yaml"
+    test_path.write_text(text)
+
+    processor = YamlCryptProcessor(
+        args=YamlCryptProcessorArgs(input=test_path),
+        config=YamlCryptConfig().load(tmp_path / "config.yaml"),
+    )
+    (document,) = processor.documents()
+    assert not document.encrypt()
+    assert document.dump() == text
+
+
+@pytest.mark.parametrize("test_file", get_working_files("test_encrypt_decrypt"))
+def test_from_string(tmp_path, test_file):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    text = (TEST_DATA_PATH / "test_encrypt_decrypt" / test_file).read_text()
+
+    encrypted = YamlCryptProcessor.from_string(text, config).encrypt()
+    assert "YamlCrypt[" in encrypted
+    assert YamlCryptProcessor.from_string(encrypted.encode("utf-8"), config).check() == []
+    assert YamlCryptProcessor.from_string(encrypted, config).decrypt() == text
+    assert list(tmp_path.iterdir()) == [tmp_path / "config.yaml"]
+
+
+def test_from_string_path_selects_rules(tmp_path):
+    yaml = YAML(typ="safe")
+    config = yaml.load(default_test_config())
+    config["yamlcrypt"]["rules"][0]["files"] = ["*.secrets.yaml"]
+    with (tmp_path / "config.yaml").open("w", encoding="utf-8") as f:
+        yaml.dump(config, f)
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    text = "some:\n  path:\n    with:\n      value: secret\n"
+
+    assert YamlCryptProcessor.from_string(text, config, path=Path("all.yaml")).encrypt() == text
+    assert (
+        "YamlCrypt["
+        in YamlCryptProcessor.from_string(text, config, path=Path("all.secrets.yaml")).encrypt()
+    )
+
+
+def test_from_data(tmp_path):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    yaml = YAML()
+    yaml.preserve_quotes = True
+    data = yaml.load(
+        "some:\n  path:\n    with:\n      plain: value\n      quoted: 'it''s'\n"
+        "      literal: |\n        multi\n        line\n      number: 1\nother: value\n"
+    )
+    values = {"plain": "value", "quoted": "it's", "literal": "multi\nline\n", "number": 1}
+    expected = {"some": {"path": {"with": values}}, "other": "value"}
+
+    assert YamlCryptProcessor.from_data(data, config).encrypt() is data
+    values = data["some"]["path"]["with"]
+    assert all(values[key].startswith("YamlCrypt[") for key in ["plain", "quoted", "literal"])
+    assert values["number"] == 1
+    assert YamlCryptProcessor.from_data(data, config).check() == []
+
+    assert YamlCryptProcessor.from_data(data, config).decrypt() == expected
+    assert type(values["quoted"]).__name__ == "SingleQuotedScalarString"
+    assert type(values["literal"]).__name__ == "LiteralScalarString"
+
+
+@pytest.mark.parametrize("from_string", [False, True])
+def test_from_data_escaped_values(tmp_path, from_string):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    yaml = YAML()
+    yaml.preserve_quotes = True
+    text = (
+        "some:\n  path:\n    with:\n      single: 'it''s'\n      double: \"tab\\there \\\"q\\\"\"\n"
+        "      backslash: 'a\\b'\n"
+    )
+    expected = yaml.load(text)
+    if from_string:
+        data = yaml.load(YamlCryptProcessor.from_string(text, config).encrypt())
+    else:
+        data = YamlCryptProcessor.from_data(yaml.load(text), config).encrypt()
+    assert "YamlCrypt[" in data["some"]["path"]["with"]["single"]
+
+    assert YamlCryptProcessor.from_data(data, config).decrypt() == expected
+    values = data["some"]["path"]["with"]
+    assert values["double"] == 'tab\there "q"'
+    assert type(values["double"]).__name__ == "DoubleQuotedScalarString"
+
+
+@pytest.mark.parametrize("test_file", get_working_files("test_encrypt_decrypt"))
+def test_get(tmp_path, test_file):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    if "backslash_newline" in test_file:
+        pytest.skip("The envelope of quoted values does not keep escaped line breaks")
+    text = (TEST_DATA_PATH / "test_encrypt_decrypt" / test_file).read_text()
+    expected = YamlCryptProcessor.from_string(text, config).get("some.path.with.*")
+    encrypted = YamlCryptProcessor.from_string(text, config).encrypt()
+
+    assert YamlCryptProcessor.from_string(encrypted, config).get("some.path.with.*") == expected
+    assert all(isinstance(value, str) and "YamlCrypt[" not in value for value in expected)
+
+
+def test_get_only_decrypts_requested_values(tmp_path, monkeypatch):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    text = "some:\n  path:\n    with:\n      a: first\n      b: second\n      c: 'it''s'\n"
+    encrypted = YamlCryptProcessor.from_string(text, config).encrypt()
+    decrypted = []
+    decrypt = pyrage.decrypt
+    monkeypatch.setattr(pyrage, "decrypt", lambda *args: decrypted.append(args) or decrypt(*args))
+
+    assert YamlCryptProcessor.from_string(encrypted, config).get("some.path.with.b") == ["second"]
+    assert len(decrypted) == 1
+    assert YamlCryptProcessor.from_string(encrypted, config).get("/some/path/with/c") == ["it's"]
+    (values,) = YamlCryptProcessor.from_string(encrypted, config).get("some.path")
+    assert values == {"with": {"a": "first", "b": "second", "c": "it's"}}
+    assert YamlCryptProcessor.from_string(encrypted, config).get("some.missing") == []
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "some:\n  path:\n    with:\n      value: 'last value'\n...\n",
+        "some:\n  path:\n    with:\n      value: 'last value'\n# trailing comment\n",
+        'some:\n  path:\n    with:\n      value: "last value" # comment\n...\n',
+    ],
+)
+def test_last_quoted_value(tmp_path, text):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+
+    encrypted = YamlCryptProcessor.from_string(text, config).encrypt()
+    assert YamlCryptProcessor.from_string(encrypted, config).decrypt() == text
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        'some:\n  path:\n    with:\n      value: "last\n        value" # comment\n...\n',
+        "some:\n  path:\n    with:\n      value: 'it''s last'\n...\n# trailing comment\n",
+    ],
+)
+def test_get_last_quoted_value(tmp_path, text):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    expected = YAML(typ="safe").load(text)["some"]["path"]["with"]["value"]
+
+    encrypted = YamlCryptProcessor.from_string(text, config).encrypt()
+    assert YamlCryptProcessor.from_string(encrypted, config).get("some.path.with.value") == [
+        expected
+    ]
+
+
+def test_complex_rule_path_parsed_once(tmp_path, monkeypatch):
+    yaml = YAML(typ="safe")
+    config = yaml.load(default_test_config())
+    config["yamlcrypt"]["rules"][0]["yamlpath"] = "some.path.with[.=~/secret/]"
+    yaml.dump(config, tmp_path / "config.yaml")
+    config = YamlCryptConfig().load(tmp_path / "config.yaml")
+    (rule,) = config.rules
+
+    parse_path = YAMLPath._parse_path
+    parsed = []
+
+    def counting_parse_path(self, *args, **kwargs):
+        parsed.append(self.original)
+        return parse_path(self, *args, **kwargs)
+
+    monkeypatch.setattr(YAMLPath, "_parse_path", counting_parse_path)
+    text = "---\nsome:\n  path:\n    with: [secret, other]\n" * 3
+    encrypted = YamlCryptProcessor.from_string(text, config).encrypt()
+    assert encrypted.count("YamlCrypt[") == 3
+    # At most once more for the unescaped segments, not again for each document
+    assert parsed.count(rule.yaml_path) <= 1
@@ -0,0 +1,129 @@
+import io
+import json
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from test_processor import get_failing_files
+from test_yamlcrypt import copy_test_files, yamlcrypt_args
+
+from yamlcrypt import YamlCrypt, YamlCryptError
+from yamlcrypt.client import YamlCryptClient
+from yamlcrypt.server import YamlCryptServer
+from yamlcrypt.version import __version__
+
+
+@pytest.fixture
+def server(tmp_path):
+    args = yamlcrypt_args(tmp_path, [])
+    server = YamlCryptServer(tmp_path / "yamlcrypt.sock", args.config)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def daemon_args(server, files):
+    return SimpleNamespace(
+        config=server.config_path, socket=server.socket_path, input=files, output=None
+    )
+
+
+def test_client_connect(tmp_path, server):
+    client = YamlCryptClient(server.socket_path)
+    assert client.connect(config=server.config_path, version=__version__)
+    client.close()
+    assert not client.connect(config=tmp_path / "other.yaml", version=__version__)
+    assert not YamlCryptClient(tmp_path / "missing.sock").connect(
+        config=server.config_path, version=__version__
+    )
+
+
+def test_encrypt_decrypt_through_daemon(tmp_path, server, monkeypatch):
+    failing = get_failing_files("test_encrypt_decrypt")
+    files = [file for file in copy_test_files(tmp_path) if file.name not in failing]
+    originals = [file.read_text() for file in files]
+    args = daemon_args(server, files)
+
+    # Files can only be processed by the daemon
+    monkeypatch.setattr(YamlCrypt, "processors", None)
+    YamlCrypt(args).encrypt()
+    assert all("YamlCrypt[" in file.read_text() for file in files)
+    assert YamlCrypt(args).check() == 0
+
+    YamlCrypt(args).decrypt()
+    assert [file.read_text() for file in files] == originals
+
+
+def test_stdin_stdout_through_daemon(tmp_path, server, monkeypatch, capsys):
+    files = copy_test_files(tmp_path)[:1]
+    args = daemon_args(server, [Path("-")])
+    monkeypatch.setattr("sys.stdin", io.StringIO(files[0].read_text()))
+
+    YamlCrypt(args).encrypt()
+    assert "YamlCrypt[" in capsys.readouterr().out
+
+
+def test_error_through_daemon(tmp_path, server):
+    (tmp_path / "broken.yaml").write_text("some: {\n")
+    args = daemon_args(server, [tmp_path / "broken.yaml"])
+
+    with pytest.raises(YamlCryptError) as error:
+        YamlCrypt(args).encrypt()
+    assert error.value.args == ("Could not load input file", str(tmp_path / "broken.yaml"))
+
+
+def test_stats_through_daemon(tmp_path, server, capsys):
+    files = copy_test_files(tmp_path)[:2]
+    args = daemon_args(server, files)
+    args.stats = "json"
+
+    YamlCrypt(args).encrypt()
+    stats = json.loads(capsys.readouterr().err)
+    assert [item["path"] for item in stats["files"]] == [str(file) for file in files]
+    assert stats["total"]["counters"]["values_encrypted"] > 0
+
+
+def test_export_through_daemon(tmp_path, server, monkeypatch, capsys):
+    (tmp_path / "file.yaml").write_text("some:\n  path:\n    with:\n      value: secret\n")
+    args = daemon_args(server, [tmp_path / "file.yaml"])
+    YamlCrypt(args).encrypt()
+
+    monkeypatch.setattr(YamlCrypt, "processors", None)
+    args.format = "shell"
+    YamlCrypt(args).export()
+    assert capsys.readouterr().out == "export SOME_PATH_WITH_VALUE=secret\n"
+
+
+def test_invalid_requests(server):
+    client = YamlCryptClient(server.socket_path)
+    assert client.connect(config=server.config_path, version=__version__)
+    try:
+        response = client.request("encrypt")
+        assert response["error"]["args"] == ["Missing input in request", "encrypt"]
+        client._file.write(b"[1]\n")
+        client._file.flush()
+        response = json.loads(client._file.readline())
+        assert response["error"]["args"][0] == "Invalid request"
+        # The connection is still usable
+        assert client.request("hello")["version"] == __version__
+    finally:
+        client.close()
+
+
+def test_socket_directory_should_be_private(tmp_path, server):
+    (tmp_path / "shared").mkdir()
+    (tmp_path / "shared").chmod(0o755)
+    args = yamlcrypt_args(tmp_path, [])
+    with pytest.raises(YamlCryptError, match="mode 0700"):
+        YamlCryptServer(tmp_path / "shared" / "yamlcrypt.sock", args.config)
+
+    tmp_path.chmod(0o755)
+    try:
+        client = YamlCryptClient(server.socket_path)
+        assert not client.connect(config=server.config_path, version=__version__)
+    finally:
+        tmp_path.chmod(0o700)
@@ -0,0 +1,44 @@
+import pytest
+
+from yamlcrypt.source import YamlCryptSource, iterate_documents, read_lines
+
+
+def test_read_lines(tmp_path):
+    (tmp_path / "file.yaml").write_bytes("some:\r\n  path: 'é'\r\n".encode())
+
+    text = "".join(read_lines(tmp_path / "file.yaml"))
+    assert text == (tmp_path / "file.yaml").read_text()
+
+
+@pytest.mark.parametrize(
+    "text,documents",
+    [
+        ("", []),
+        ("some: value\n", ["some: value\n"]),
+        ("---\na: 1\n---\nb: 2\n", ["---\na: 1\n", "---\nb: 2\n"]),
+        ("# head\n---\na: 1\n--- # b\nb: 2", ["# head\n---\na: 1\n", "--- # b\nb: 2"]),
+        ("a: 1\n...\n# end\nb: 2\n", ["a: 1\n...\n# end\n", "b: 2\n"]),
+        ("a: 1\n...\n%YAML 1.2\n---\nb: 2\n", ["a: 1\n...\n", "%YAML 1.2\n---\nb: 2\n"]),
+        ("a: |\n  ---\n  text\n----: 1\n", ["a: |\n  ---\n  text\n----: 1\n"]),
+    ],
+)
+def test_iterate_documents(text, documents):
+    assert list(iterate_documents(text.splitlines(keepends=True))) == documents
+
+
+def test_lines_are_lazy():
+    data = YamlCryptSource("some:\n  path: value\n...\n\n")
+    assert "lines" not in vars(data)
+    assert data.explicit_end
+    assert data.lines == ["some:", "  path: value", "...", ""]
+    assert not YamlCryptSource("some: value\n").explicit_end
+
+
+def test_next_key():
+    data = YamlCryptSource("")
+    mapping = {"a": 1, "b": 2, "c": 3}
+    assert data.next_key(mapping, "a") == "b"
+    assert data.next_key(mapping, "b") == "c"
+    assert data.next_key(mapping, "c") is None
+    assert data.next_key([1, 2], 0) == 1
+    assert data.next_key([1, 2], 1) is None
@@ -0,0 +1,66 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from test_config import default_test_config
+
+REPO_PATH = Path(__file__).parent.parent
+HEAVY_MODULES = ("ruamel.yaml", "yamlpath", "pyrage", "cryptography")
+
+
+def import_times(*args):
+    """Run python with -X importtime and return the cumulative import time of each module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=REPO_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["-m", "yamlcrypt", "--help"],
+        ["-m", "yamlcrypt", "encrypt", "--help"],
+        ["-c", "import yamlcrypt.client"],
+    ],
+)
+def test_startup_does_not_import_heavy_modules(args):
+    imported = import_times(*args)
+    assert not [name for name in imported if name.startswith(HEAVY_MODULES)]
+
+
+SIMPLE_RULES_SCRIPT = """
+import sys
+from pathlib import Path
+from yamlcrypt.config import YamlCryptConfig
+from yamlcrypt.processor import YamlCryptProcessor
+
+config = YamlCryptConfig().load(Path(sys.argv[1]))
+text = "---\\nsome:\\n  path:\\n    with:\\n      a: secret\\n"
+encrypted = YamlCryptProcessor.from_string(text, config).encrypt()
+assert YamlCryptProcessor.from_string(encrypted, config).decrypt() == text
+print([name for name in sys.modules if name.startswith("yamlpath")])
+"""
+
+
+def test_simple_rules_do_not_import_yamlpath(tmp_path):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    result = subprocess.run(
+        [sys.executable, "-c", SIMPLE_RULES_SCRIPT, str(tmp_path / "config.yaml")],
+        cwd=REPO_PATH,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,33 @@
+import json
+
+from yamlcrypt.stats import STATS_JSON, YamlCryptStats, format_stats
+
+
+def test_iterate_only_times_items():
+    stats = YamlCryptStats()
+    items = []
+    for item in stats.iterate("read", range(3)):
+        items.append(item)
+    assert items == [0, 1, 2]
+    assert stats.timers["read"] > 0
+
+
+def test_format_stats():
+    first = YamlCryptStats(path="first.yaml", counters={"documents": 1}, timers={"load": 0.5})
+    second = YamlCryptStats.from_dict(
+        YamlCryptStats(path="second.yaml", counters={"documents": 2}).to_dict()
+    )
+
+    human = format_stats([first, second], extra={"peak_memory": 10}).splitlines()
+    assert [line.split(":")[0] for line in human] == [
+        "first.yaml",
+        "second.yaml",
+        "total",
+        "peak_memory",
+    ]
+    assert "documents=3" in human[2]
+    assert "load=500.0ms" in human[2]
+
+    data = json.loads(format_stats([first, second], STATS_JSON))
+    assert [item["path"] for item in data["files"]] == ["first.yaml", "second.yaml"]
+    assert data["total"]["counters"]["documents"] == 3
@@ -0,0 +1,126 @@
+import shutil
+import subprocess
+
+import pytest
+from test_yamlcrypt import copy_test_files, yamlcrypt_args
+
+from yamlcrypt import YamlCrypt
+from yamlcrypt.walker import YamlCryptWalker, translate_pattern
+
+
+@pytest.mark.parametrize(
+    "pattern, matching, not_matching",
+    [
+        ("*.yaml", ["a.yaml", "dir/a.yaml"], ["a.yml", "a.yaml/b"]),
+        ("/root.yaml", ["root.yaml"], ["dir/root.yaml"]),
+        ("dir/*.yaml", ["dir/a.yaml"], ["other/dir/a.yaml", "dir/sub/a.yaml"]),
+        ("**/dir", ["dir", "a/b/dir"], ["dir/a"]),
+        ("dir/**", ["dir/a", "dir/a/b"], ["dir", "other/dir/a"]),
+        ("a/**/b", ["a/b", "a/x/b", "a/x/y/b"], ["a/xb"]),
+        ("file?.yaml", ["file1.yaml"], ["file.yaml", "file/.yaml"]),
+        ("file[0-2].yaml", ["file1.yaml"], ["file3.yaml"]),
+        ("file[!0-2].yaml", ["file3.yaml"], ["file1.yaml"]),
+        ("\\#file", ["#file"], ["file"]),
+    ],
+)
+def test_translate_pattern(pattern, matching, not_matching):
+    regex = translate_pattern(pattern)
+    assert [path for path in matching if regex.fullmatch(path)] == matching
+    assert [path for path in not_matching if regex.fullmatch(path)] == []
+
+
+def make_tree(root, files):
+    for name, content in files.items():
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_text(content)
+
+
+TREE = {
+    ".gitignore": "# Generated\nbuild/\n*.local.yaml\n!keep.local.yaml\n/root-only.yaml\n",
+    "a.yaml": "",
+    "b.yml": "",
+    "c.txt": "",
+    "root-only.yaml": "",
+    "x.local.yaml": "",
+    "keep.local.yaml": "",
+    "build/generated.yaml": "",
+    "sub/root-only.yaml": "",
+    "sub/.gitignore": "*.yml\n!keep.local.yaml\n",
+    "sub/d.yml": "",
+    "sub/deeper/e.yaml": "",
+    "vendor/f.yaml": "",
+}
+
+
+def test_walk(tmp_path):
+    make_tree(tmp_path, TREE)
+
+    # Files are found in path order, whatever the order the directories are scanned in
+    found = [path.relative_to(tmp_path).as_posix() for path in YamlCryptWalker().walk(tmp_path)]
+    assert found == [
+        "a.yaml",
+        "b.yml",
+        "keep.local.yaml",
+        "sub/deeper/e.yaml",
+        "sub/root-only.yaml",
+        "vendor/f.yaml",
+    ]
+
+    walker = YamlCryptWalker(
+        include=["*.yaml"], exclude=["vendor", "deeper/*.yaml"], gitignore=False
+    )
+    found = [path.relative_to(tmp_path).as_posix() for path in walker.walk(tmp_path)]
+    assert found == [
+        "a.yaml",
+        "build/generated.yaml",
+        "keep.local.yaml",
+        "root-only.yaml",
+        "sub/root-only.yaml",
+        "x.local.yaml",
+    ]
+
+
+def test_walk_parent_gitignore(tmp_path):
+    make_tree(tmp_path, TREE)
+    (tmp_path / ".git" / "info").mkdir(parents=True)
+    (tmp_path / ".git" / "info" / "exclude").write_text("e.yaml\n")
+
+    found = sorted(path.name for path in YamlCryptWalker().walk(tmp_path / "sub"))
+    assert found == ["root-only.yaml"]
+
+    # Outside of a repository, parent .gitignore files do not apply
+    shutil.rmtree(tmp_path / ".git")
+    found = sorted(path.name for path in YamlCryptWalker().walk(tmp_path / "sub"))
+    assert found == ["e.yaml", "root-only.yaml"]
+
+
+@pytest.mark.skipif(not shutil.which("git"), reason="git is not installed")
+def test_walk_matches_git(tmp_path):
+    make_tree(tmp_path, TREE)
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    listed = subprocess.run(
+        ["git", "ls-files", "--others", "--exclude-standard", "*.yaml", "*.yml"],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+
+    found = [path.relative_to(tmp_path).as_posix() for path in YamlCryptWalker().walk(tmp_path)]
+    assert sorted(found) == sorted(listed)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_recursive(tmp_path, jobs):
+    (tmp_path / "files" / "nested").mkdir(parents=True)
+    files = copy_test_files(tmp_path / "files" / "nested")
+    (tmp_path / "files" / ".gitignore").write_text("ignored.yaml\n")
+    ignored = tmp_path / "files" / "ignored.yaml"
+    ignored.write_text(files[0].read_text())
+    args = yamlcrypt_args(tmp_path, [tmp_path / "files"], jobs=jobs)
+    args.recursive = True
+
+    YamlCrypt(args).encrypt()
+    assert all("YamlCrypt[" in file.read_text() for file in files)
+    assert "YamlCrypt[" not in ignored.read_text()
+    assert YamlCrypt(args).check() == 0
@@ -0,0 +1,328 @@
+import json
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pyrage
+import pytest
+from test_config import default_test_config
+from test_processor import get_failing_files
+
+from yamlcrypt import YamlCrypt, YamlCryptError
+from yamlcrypt.yamlcrypt import MAX_PENDING_PER_JOB
+
+TEST_DATA_PATH = Path(__file__).parent / "data"
+
+
+def copy_test_files(tmp_path):
+    files = []
+    for test_file in sorted((TEST_DATA_PATH / "test_encrypt_decrypt").glob("*.yaml")):
+        files.append(Path(shutil.copy(test_file, tmp_path / test_file.name)))
+    return files
+
+
+def yamlcrypt_args(tmp_path, files, jobs=None):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    return SimpleNamespace(config=tmp_path / "config.yaml", input=files, output=None, jobs=jobs)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_encrypt_decrypt_multiple_files(tmp_path, jobs):
+    files = copy_test_files(tmp_path)
+    originals = [file.read_text() for file in files]
+    args = yamlcrypt_args(tmp_path, files, jobs=jobs)
+
+    YamlCrypt(args).encrypt()
+    for file, original in zip(files, originals, strict=True):
+        assert file.read_text() != original
+        assert "YamlCrypt[" in file.read_text()
+
+    YamlCrypt(args).decrypt()
+    failing = get_failing_files("test_encrypt_decrypt")
+    for file, original in zip(files, originals, strict=True):
+        assert "YamlCrypt[" not in file.read_text()
+        if file.name not in failing:
+            assert file.read_text() == original
+
+
+def test_parallel_files_are_processed_as_found(tmp_path, monkeypatch):
+    files = copy_test_files(tmp_path)[:2]
+    args = yamlcrypt_args(tmp_path, files, jobs=2)
+
+    def inputs(self):
+        yield files[0]
+        # The second file is only found once the first one was processed
+        deadline = time.monotonic() + 30
+        while "YamlCrypt[" not in files[0].read_text():
+            assert time.monotonic() < deadline, "the first file was not processed"
+            time.sleep(0.01)
+        yield files[1]
+
+    monkeypatch.setattr(YamlCrypt, "inputs", inputs)
+    YamlCrypt(args).encrypt()
+    assert all("YamlCrypt[" in file.read_text() for file in files)
+
+
+def test_parallel_error_is_reported_in_input_order(tmp_path):
+    files = copy_test_files(tmp_path)
+    (tmp_path / "broken_1.yaml").write_text("some: [\n")
+    (tmp_path / "broken_2.yaml").write_text("some: {\n")
+    files = files[:2] + [tmp_path / "broken_2.yaml", tmp_path / "broken_1.yaml"] + files[2:]
+    args = yamlcrypt_args(tmp_path, files, jobs=4)
+
+    with pytest.raises(YamlCryptError) as error:
+        YamlCrypt(args).encrypt()
+    assert error.value.args[0] == "Could not load input file"
+    assert error.value.args[1] == str(tmp_path / "broken_2.yaml")
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_error_stops_before_later_files(tmp_path, jobs):
+    # Slow to fail, the other workers process the next files meanwhile
+    lines = "".join(f"  key_{index}: value\n" for index in range(4000))
+    (tmp_path / "broken.yaml").write_text(f"some:\n{lines}  broken: [\n")
+    text = "some:\n  path:\n    with:\n      value: secret\n"
+    files = [tmp_path / "broken.yaml"]
+    for index in range(20):
+        files.append(tmp_path / f"valid_{index:02}.yaml")
+        files[-1].write_text(text)
+    args = yamlcrypt_args(tmp_path, files, jobs=jobs)
+
+    with pytest.raises(YamlCryptError) as error:
+        YamlCrypt(args).encrypt()
+    assert error.value.args == ("Could not load input file", str(tmp_path / "broken.yaml"))
+    # Only the files submitted with the failing one may have been processed
+    processed = [file for file in files[1:] if file.read_text() != text]
+    assert processed == files[1 : len(processed) + 1]
+    assert len(processed) < (1 if jobs == 1 else MAX_PENDING_PER_JOB * jobs)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_check(tmp_path, jobs, capsys):
+    files = copy_test_files(tmp_path)
+    args = yamlcrypt_args(tmp_path, files, jobs=jobs)
+    YamlCrypt(args).encrypt()
+    contents = [file.read_text() for file in files]
+
+    assert YamlCrypt(args).check() == 0
+    assert capsys.readouterr().out == ""
+
+    (tmp_path / "all.yaml").write_text(
+        (tmp_path / "all.yaml").read_text() + "      Added: not encrypted\n"
+    )
+    assert YamlCrypt(args).check() == 1
+    out = capsys.readouterr().out
+    assert out == f"{tmp_path / 'all.yaml'}: some.path.with.Added is not encrypted\n"
+    for file, content in zip(files, contents, strict=True):
+        if file.name != "all.yaml":
+            assert file.read_text() == content
+
+
+def test_get(tmp_path, capsys, monkeypatch):
+    test_path = tmp_path / "file.yaml"
+    test_path.write_text(
+        "some:\n  path:\n    with:\n      a: first\n      b: |\n        multi\n        line\n"
+        "    do-not-crypt: 1\n"
+    )
+    args = yamlcrypt_args(tmp_path, [test_path])
+    YamlCrypt(args).encrypt()
+    encrypted = test_path.read_text()
+    decrypted = []
+    decrypt = pyrage.decrypt
+    monkeypatch.setattr(pyrage, "decrypt", lambda *args: decrypted.append(args) or decrypt(*args))
+
+    args = SimpleNamespace(config=args.config, input=test_path, yaml_path=["some.path.with.a"])
+    YamlCrypt(args).get()
+    assert capsys.readouterr().out == "first\n"
+    assert len(decrypted) == 1
+    args.yaml_path = ["some.path.with.b", "some.path.do-not-crypt", "some.path.with"]
+    YamlCrypt(args).get()
+    assert capsys.readouterr().out == "multi\nline\n1\na: first\nb: |\n  multi\n  line\n"
+    assert test_path.read_text() == encrypted
+
+    args.yaml_path = ["some.missing"]
+    with pytest.raises(YamlCryptError, match="No value found"):
+        YamlCrypt(args).get()
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_export(tmp_path, capsys, jobs):
+    files = [tmp_path / "first.yaml", tmp_path / "second.yaml"]
+    files[0].write_text("some:\n  path:\n    with:\n      a: first\n      b: 'it''s'\n")
+    files[1].write_text("some:\n  path:\n    with:\n      c: 12\n    do-not-crypt: value\n")
+    args = yamlcrypt_args(tmp_path, files, jobs=jobs)
+    YamlCrypt(args).encrypt()
+    encrypted = [file.read_text() for file in files]
+
+    args.format = "json"
+    YamlCrypt(args).export()
+    assert json.loads(capsys.readouterr().out) == {
+        "some.path.with.a": "first",
+        "some.path.with.b": "it's",
+        "some.path.with.c": "12",
+    }
+    args.format = "dotenv"
+    args.prefix = "app_"
+    YamlCrypt(args).export()
+    assert capsys.readouterr().out == (
+        'APP_SOME_PATH_WITH_A=first\nAPP_SOME_PATH_WITH_B="it\'s"\nAPP_SOME_PATH_WITH_C=12\n'
+    )
+    assert [file.read_text() for file in files] == encrypted
+    assert sorted(tmp_path.iterdir()) == sorted([tmp_path / "config.yaml", *files])
+
+    # The same path in several files is not silently replaced
+    files[1].write_text("some:\n  path:\n    with:\n      a: second\n")
+    with pytest.raises(YamlCryptError, match="exported more than once") as error:
+        YamlCrypt(args).export()
+    assert error.value.args[1] == "some.path.with.a"
+
+
+def test_stdin_stdout_pipeline(tmp_path):
+    (tmp_path / "config.yaml").write_text(default_test_config())
+    test_path = TEST_DATA_PATH / "test_encrypt_decrypt" / "LiteralScalarString.yaml"
+    command = [sys.executable, "-m", "yamlcrypt", "--config", str(tmp_path / "config.yaml")]
+
+    encrypted = subprocess.run(
+        [*command, "encrypt", "-"],
+        input=test_path.read_text(),
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+    ).stdout
+    assert "YamlCrypt[" in encrypted
+
+    decrypted = subprocess.run(
+        [*command, "decrypt", "-", "--output", "-"],
+        input=encrypted,
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+    ).stdout
+    assert decrypted == test_path.read_text()
+
+    # Content without anything to decrypt is passed through
+    passthrough = subprocess.run(
+        [*command, "decrypt", "-"],
+        input=decrypted,
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+    ).stdout
+    assert passthrough == decrypted
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_stats(tmp_path, jobs, capsys):
+    files = copy_test_files(tmp_path)
+    args = yamlcrypt_args(tmp_path, files, jobs=jobs)
+    args.stats = "json"
+
+    YamlCrypt(args).encrypt()
+    stats = json.loads(capsys.readouterr().err)
+    assert [item["path"] for item in stats["files"]] == [str(file) for file in files]
+    assert stats["total"]["counters"]["documents"] == len(files)
+    assert stats["total"]["counters"]["values_encrypted"] > 0
+    assert (
+        stats["total"]["counters"]["values_encrypted"]
+        == (stats["total"]["counters"]["nodes_matched"])
+    )
+    assert all(item["timers"]["load"] > 0 for item in stats["files"])
+
+    YamlCrypt(args).decrypt()
+    stats = json.loads(capsys.readouterr().err)
+    assert (
+        stats["total"]["counters"]["values_decrypted"]
+        == (stats["total"]["counters"]["nodes_matched"])
+    )
+
+
+def test_profile(tmp_path, capsys):
+    files = copy_test_files(tmp_path)
+    args = yamlcrypt_args(tmp_path, files, jobs=4)
+    args.profile = tmp_path / "profile.out"
+    args.trace_memory = True
+
+    YamlCrypt(args).encrypt()
+    # Files are processed in this process to be profiled
+    profiled = pstats.Stats(str(args.profile)).stats
+    assert any(path.endswith("processor.py") and name == "encrypt" for path, _, name in profiled)
+    err = capsys.readouterr().err
+    assert f"profile: {args.profile}" in err
+    assert "peak_memory: " in err
+
+
+def incremental_run(args, command, force=False):
+    args.incremental = True
+    args.force = force
+    yamlcrypt = YamlCrypt(args)
+    result = getattr(yamlcrypt, command)()
+    return result, [Path(stats.path) for stats in yamlcrypt.stats]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_incremental(tmp_path, jobs):
+    files = copy_test_files(tmp_path)
+    args = yamlcrypt_args(tmp_path, files, jobs=jobs)
+
+    assert incremental_run(args, "encrypt")[1] == files
+    assert (tmp_path / ".yamlcrypt.manifest.json").is_file()
+    assert incremental_run(args, "encrypt")[1] == []
+    assert incremental_run(args, "check") == (0, [])
+
+    # Only changed files are processed again
+    (tmp_path / "all.yaml").write_text(
+        (tmp_path / "all.yaml").read_text() + "      Added: not encrypted\n"
+    )
+    assert incremental_run(args, "check") == (1, [tmp_path / "all.yaml"])
+    assert incremental_run(args, "encrypt")[1] == [tmp_path / "all.yaml"]
+    assert incremental_run(args, "check") == (0, [])
+    assert incremental_run(args, "encrypt", force=True)[1] == files
+
+    # Files are recorded with the state the command left them in
+    assert incremental_run(args, "decrypt")[1] == files
+    assert incremental_run(args, "decrypt")[1] == []
+    assert incremental_run(args, "encrypt")[1] == files
+
+
+def test_incremental_config_change(tmp_path):
+    files = copy_test_files(tmp_path)
+    args = yamlcrypt_args(tmp_path, files)
+    args.manifest = tmp_path / "manifest.json"
+    incremental_run(args, "encrypt")
+    assert incremental_run(args, "encrypt")[1] == []
+
+    # New recipients invalidate every file
+    args.config.write_text(default_test_config())
+    assert incremental_run(args, "encrypt")[1] == files
+    assert incremental_run(args, "encrypt")[1] == []
+
+    config = args.config.read_text()
+    args.config.write_text(config.replace('"some.path.with.*"', '"some.path.*"'))
+    assert incremental_run(args, "check")[1] == files
+
+
+@pytest.mark.parametrize("env, args", [({"YAMLCRYPT_JOBS": "abc"}, []), ({}, ["--jobs", "0"])])
+def test_invalid_jobs(tmp_path, env, args):
+    command = [sys.executable, "-m", "yamlcrypt", *args, "check", str(tmp_path / "file.yaml")]
+    result = subprocess.run(command, env={**os.environ, **env}, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "error: argument --jobs/-j" in result.stderr
+    assert "Traceback" not in result.stderr
+
+
+def test_invalid_jobs_env_help():
+    # The environment variable is only checked when the arguments are parsed
+    result = subprocess.run(
+        [sys.executable, "-m", "yamlcrypt", "--help"],
+        env={**os.environ, "YAMLCRYPT_JOBS": "abc"},
+        capture_output=True,
+    )
+    assert result.returncode == 0
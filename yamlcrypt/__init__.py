@@ -1,22 +1,33 @@
-from importlib.metadata import PackageNotFoundError, version
+from importlib import import_module
 
-from yamlcrypt.config import YamlCryptConfig
 from yamlcrypt.errors import (
     YamlCryptConfigNotFoundError,
     YamlCryptDuplicateIdentify,
     YamlCryptError,
 )
-from yamlcrypt.yamlcrypt import YamlCrypt
+from yamlcrypt.version import __version__
 
-try:
-    __version__ = version("yamlcrypt")
-except PackageNotFoundError:
-    __version__ = "dev"
+# Imported on first access, so the CLI only loads the dependencies of the command it runs
+_LAZY_ATTRIBUTES = {
+    "AsyncYamlCrypt": "yamlcrypt.aio",
+    "YamlCrypt": "yamlcrypt.yamlcrypt",
+    "YamlCryptConfig": "yamlcrypt.config",
+}
 
 __all__ = [
+    "AsyncYamlCrypt",
     "YamlCrypt",
     "YamlCryptConfig",
     "YamlCryptConfigNotFoundError",
     "YamlCryptDuplicateIdentify",
     "YamlCryptError",
+    "__version__",
 ]
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(import_module(_LAZY_ATTRIBUTES[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
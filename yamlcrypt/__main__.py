@@ -1,9 +1,14 @@
 import argparse
 import os
+import sys
 from pathlib import Path
 
 from yamlcrypt import __version__
-from yamlcrypt.yamlcrypt import YamlCrypt
+from yamlcrypt.client import default_socket_path
+from yamlcrypt.export import EXPORT_DOTENV, EXPORT_FORMATS
+from yamlcrypt.output import FSYNC_FILE, FSYNC_POLICIES
+from yamlcrypt.stats import STATS_FORMATS, STATS_HUMAN, STATS_JSON
+from yamlcrypt.walker import DEFAULT_INCLUDE
 
 DEFAULT_CONFIG = ".yamlcrypt.yaml"
 
@@ -15,6 +20,56 @@ class CheckOutputAction(argparse.Action):
         setattr(namespace, self.dest, values)
 
 
+def positive_int(value):
+    """Parse a number of at least 1, reported as a usage error otherwise."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"should be at least 1: {value!r}")
+    return number
+
+
+def add_walk_arguments(parser):
+    parser.add_argument(
+        "--recursive",
+        "-r",
+        action="store_true",
+        help="Process the files found in the input directories",
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        metavar="GLOB",
+        help=(
+            "Pattern of the files to process in the input directories, matched from the right"
+            f" of their path (default: {', '.join(DEFAULT_INCLUDE)})"
+        ),
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        metavar="GLOB",
+        help="Pattern of the files and directories to skip in the input directories",
+    )
+    parser.add_argument(
+        "--no-gitignore",
+        action="store_true",
+        help="Also process the files ignored by .gitignore files in the input directories",
+    )
+
+
+def command(name):
+    def run(args):
+        # Only imported once the arguments are parsed, --help does not need it
+        from yamlcrypt.yamlcrypt import YamlCrypt
+
+        return getattr(YamlCrypt(args), name)()
+
+    return run
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog="yamlcrypt",
@@ -31,6 +86,101 @@ def main():
             " (default: %(default)s)"
         ),
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=positive_int,
+        # Converted by argparse, so an invalid value is a usage error
+        default=os.getenv("YAMLCRYPT_JOBS", str(os.cpu_count() or 1)),
+        help=(
+            "Number of files processed in parallel"
+            " It can also be set via YAMLCRYPT_JOBS environment variable"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--fsync",
+        choices=FSYNC_POLICIES,
+        default=os.getenv("YAMLCRYPT_FSYNC", FSYNC_FILE),
+        help=(
+            "Flush written files to disk before they replace the previous ones (file), also"
+            " flush their directory (full) or leave it to the system (none)"
+            " It can also be set via YAMLCRYPT_FSYNC environment variable"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=Path(os.getenv("YAMLCRYPT_SOCKET", default_socket_path())),
+        help=(
+            "Path to the Unix socket of the yamlcrypt serve daemon, used when it is running"
+            " It can also be set via YAMLCRYPT_SOCKET environment variable"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="Process the files in this process even when a daemon is running",
+    )
+
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=bool(os.getenv("YAMLCRYPT_INCREMENTAL")),
+        help=(
+            "Skip the files which did not change since they were last encrypted or decrypted,"
+            " as recorded in the manifest"
+            " It can also be set via YAMLCRYPT_INCREMENTAL environment variable"
+        ),
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        help=(
+            "Path to the manifest of the incremental mode"
+            " (default: .yamlcrypt.manifest.json next to the config file)"
+        ),
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Process every file in incremental mode, and record them in the manifest",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_const",
+        const=STATS_HUMAN,
+        default=os.getenv("YAMLCRYPT_STATS"),
+        help=(
+            "Report counters and the time spent in each phase for every file on stderr"
+            f" It can also be set via YAMLCRYPT_STATS environment variable ({', '.join(STATS_FORMATS)})"
+        ),
+    )
+    parser.add_argument(
+        "--stats-json",
+        dest="stats",
+        action="store_const",
+        const=STATS_JSON,
+        help="Report the stats as JSON",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        help=(
+            "Profile the command with cProfile and write the stats to this file"
+            " (files are then processed in this process)"
+        ),
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help=(
+            "Report the peak memory allocated by Python with the stats"
+            " (files are then processed in this process)"
+        ),
+    )
 
     subparsers = parser.add_subparsers(dest="command", help="Commands")
 
@@ -39,34 +189,125 @@ def main():
     encrypt_parser.add_argument(
         "--output",
         type=Path,
-        help=("Path to save the encrypted file (When used input should have exactly one value)"),
+        help=(
+            "Path to save the encrypted file, - for stdout"
+            " (When used input should have exactly one value)"
+        ),
     )
     encrypt_parser.add_argument(
         "input",
         nargs="+",
         type=Path,
         action=CheckOutputAction,
-        help="The input YAML file to encrypt",
+        help="The input YAML file to encrypt, - for stdin (written to stdout)",
     )
 
-    encrypt_parser.set_defaults(func=lambda args: YamlCrypt(args).encrypt())
+    encrypt_parser.add_argument(
+        "--splice",
+        action="store_true",
+        help="Only rewrite the changed values, keeping the rest of the file byte for byte",
+    )
+
+    add_walk_arguments(encrypt_parser)
+
+    encrypt_parser.set_defaults(func=command("encrypt"))
 
     # Decrypt command
     decrypt_parser = subparsers.add_parser("decrypt", help="Decrypt a YAML file")
     decrypt_parser.add_argument(
         "--output",
         type=Path,
-        help=("Path to save the encrypted file (When used input should have exactly one value)"),
+        help=(
+            "Path to save the decrypted file, - for stdout"
+            " (When used input should have exactly one value)"
+        ),
     )
     decrypt_parser.add_argument(
         "input",
         nargs="+",
         action=CheckOutputAction,
         type=Path,
-        help="The input YAML file to encrypt",
+        help="The input YAML file to decrypt, - for stdin (written to stdout)",
+    )
+
+    decrypt_parser.add_argument(
+        "--splice",
+        action="store_true",
+        help="Only rewrite the changed values, keeping the rest of the file byte for byte",
+    )
+
+    add_walk_arguments(decrypt_parser)
+
+    decrypt_parser.set_defaults(func=command("decrypt"))
+
+    # Check command
+    check_parser = subparsers.add_parser(
+        "check", help="Check that the values matched by the rules are encrypted"
+    )
+    check_parser.add_argument(
+        "input",
+        nargs="+",
+        type=Path,
+        help="The input YAML files to check, - for stdin",
+    )
+
+    add_walk_arguments(check_parser)
+
+    check_parser.set_defaults(func=command("check"))
+
+    # Export command
+    export_parser = subparsers.add_parser(
+        "export",
+        help="Print the decrypted values matched by the rules as environment variables or JSON",
+    )
+    export_parser.add_argument(
+        "input",
+        nargs="+",
+        type=Path,
+        help="The input YAML files, - for stdin",
+    )
+    export_parser.add_argument(
+        "--format",
+        choices=EXPORT_FORMATS,
+        default=EXPORT_DOTENV,
+        help=(
+            "KEY=value lines, a shell script of export statements or a JSON object keyed by"
+            " YAML path (default: %(default)s)"
+        ),
+    )
+    export_parser.add_argument(
+        "--prefix",
+        default="",
+        help="Prefix of the variable names, which are built from the YAML paths",
+    )
+
+    add_walk_arguments(export_parser)
+
+    export_parser.set_defaults(func=command("export"))
+
+    # Get command
+    get_parser = subparsers.add_parser(
+        "get", help="Print the decrypted values of some nodes, without rewriting the file"
+    )
+    get_parser.add_argument(
+        "input",
+        type=Path,
+        help="The input YAML file, - for stdin",
+    )
+    get_parser.add_argument(
+        "yaml_path",
+        nargs="+",
+        help="YAML path of the nodes to print, collections are printed as YAML",
+    )
+
+    get_parser.set_defaults(func=command("get"))
+
+    # Serve command
+    serve_parser = subparsers.add_parser(
+        "serve", help="Run a daemon processing the commands of other yamlcrypt calls"
     )
 
-    decrypt_parser.set_defaults(func=lambda args: YamlCrypt(args).decrypt())
+    serve_parser.set_defaults(func=command("serve"))
 
     # Recipients commands
     recipient_parser = subparsers.add_parser("recipient", help="Manage recipient keys")
@@ -84,17 +325,17 @@ def main():
         help="The path of the file where to output the recipient's private key",
     )
 
-    recipient_add.set_defaults(func=lambda args: YamlCrypt(args).recipient_add())
+    recipient_add.set_defaults(func=command("recipient_add"))
 
     # Parse arguments
     args = parser.parse_args()
 
     # Call the assigned function
     if hasattr(args, "func"):
-        args.func(args)
+        return args.func(args)
     else:
         parser.print_help()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
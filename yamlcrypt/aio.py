@@ -0,0 +1,98 @@
+import asyncio
+import contextlib
+import functools
+import weakref
+from pathlib import Path
+
+from yamlcrypt.config import YamlCryptConfig
+from yamlcrypt.logger import DelayedLogger, logger
+from yamlcrypt.processor import YamlCryptProcessor, YamlCryptProcessorArgs
+
+COMMANDS = ("encrypt", "decrypt", "check", "get", "export")
+
+
+def process(command, config, input, output=None, splice=False, arguments=()):
+    """Run a processor command on YAML text or a file, with the given arguments.
+
+    Only a Path input is a file, a str is always YAML text. Return the log records, the
+    result and the error of the command. The result is the processed text for text inputs,
+    so it can run in a thread or in another process.
+    """
+    log = DelayedLogger(logger())
+    try:
+        if isinstance(input, Path):
+            args = YamlCryptProcessorArgs(input=input, output=output, splice=splice)
+            processor = YamlCryptProcessor(args=args, config=config, log=log)
+        elif isinstance(input, str | bytes):
+            processor = YamlCryptProcessor.from_string(input, config, splice=splice, log=log)
+        else:
+            raise TypeError(f"Input should be YAML text or a Path, not {type(input).__name__}")
+        result = getattr(processor, command)(*arguments)
+    except Exception as error:
+        return log.records(), None, error
+    return log.records(), result, None
+
+
+class AsyncYamlCrypt:
+    """Encrypt, decrypt and check YAML documents from asyncio code.
+
+    Inputs are YAML text (str or bytes), for which the processed text is returned, or file
+    paths, processed in place or to output. Paths must be given as Path, a str is always
+    YAML text. Documents are processed in an executor, the default one of the event loop
+    unless one is given, and at most concurrency of them are processed at the same time.
+    """
+
+    def __init__(self, config, executor=None, concurrency=None, log=None):
+        self.log = log or logger()
+        if not isinstance(config, YamlCryptConfig):
+            config = YamlCryptConfig(self.log).load(path=Path(config))
+        # Keys are resolved once, instead of by each document
+        self.config = config.preload_keys()
+        self.executor = executor
+        self.concurrency = concurrency
+        # Created in the running loop, a semaphore can only be used by the loop it waited in
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def semaphore(self):
+        """Return the semaphore bounding the concurrency in the running loop."""
+        if not self.concurrency:
+            return contextlib.nullcontext()
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        return self._semaphores[loop]
+
+    async def run(self, command, input, output=None, splice=False, arguments=()):
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command {command}")
+        async with self.semaphore():
+            records, result, error = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                functools.partial(process, command, self.config, input, output, splice, arguments),
+            )
+        DelayedLogger.load(self.log, records).dump()
+        if error:
+            raise error
+        return result
+
+    async def encrypt(self, input, output=None, splice=False):
+        return await self.run("encrypt", input, output=output, splice=splice)
+
+    async def decrypt(self, input, output=None, splice=False):
+        return await self.run("decrypt", input, output=output, splice=splice)
+
+    async def check(self, input):
+        """Return the nodes matched by a rule which are not encrypted."""
+        return await self.run("check", input)
+
+    async def export(self, input):
+        """Return the plaintext values matched by the rules by YAML path."""
+        return await self.run("export", input)
+
+    async def get(self, input, yaml_path):
+        """Return the values of the nodes matching yaml_path, only decrypting them."""
+        return await self.run("get", input, arguments=(yaml_path,))
+
+    async def gather(self, command, inputs):
+        """Run a command on many inputs concurrently, return the results in input order."""
+        return await asyncio.gather(*(self.run(command, input) for input in inputs))
@@ -0,0 +1,174 @@
+import hashlib
+import hmac
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+from yamlcrypt.filekey import NONCE_SIZE, cipher
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+LOCK_FILE = ".lock"
+
+
+def default_cache_dir():
+    return Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "yamlcrypt"
+
+
+def identities_secret(identities):
+    # Entries can only be found and read with the private keys which decrypted them
+    return hashlib.sha256(
+        "\n".join(["yamlcrypt-cache", *sorted(str(identity) for identity in identities)]).encode(
+            "utf-8"
+        )
+    ).digest()
+
+
+class YamlCryptDiskCache:
+    """Decrypted values stored in a directory, encrypted with a key derived from the identities.
+
+    Entries are named after a keyed hash of their ciphertext and expire ttl seconds after they
+    were written. Writers hold an exclusive lock on the directory, readers a shared one. When
+    the directory cannot be used, the cache is disabled and values are only kept in memory.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_CACHE_TTL, log=None):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.log = log
+        self.disabled = False
+        self._pruned = False
+
+    def disable(self, error):
+        self.disabled = True
+        if self.log:
+            self.log.verbose(f"Disk cache disabled, {self.path} cannot be used: {error}")
+
+    @contextmanager
+    def lock(self, exclusive=False):
+        # fcntl is only available on Unix, the disk cache is only used when configured
+        import fcntl
+
+        self.path.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd = os.open(self.path / LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)
+
+    def expired(self, path, now):
+        return path.stat().st_mtime + self.ttl < now
+
+    def get(self, entry, key):
+        if self.disabled:
+            return None
+        path = self.path / entry
+        try:
+            with self.lock():
+                try:
+                    if self.expired(path, time.time()):
+                        return None
+                    data = path.read_bytes()
+                except OSError:
+                    return None
+        except OSError as error:
+            self.disable(error)
+            return None
+        from cryptography.exceptions import InvalidTag
+
+        try:
+            decrypted = cipher(key).decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], entry.encode())
+        except InvalidTag:
+            # Corrupted or written with another key, it is replaced by the next set
+            return None
+        return decrypted.decode("utf-8")
+
+    def set(self, entry, key, value):
+        if self.disabled:
+            return
+        nonce = secrets.token_bytes(NONCE_SIZE)
+        data = nonce + cipher(key).encrypt(nonce, value.encode("utf-8"), entry.encode())
+        try:
+            with self.lock(exclusive=True):
+                if not self._pruned:
+                    self.prune()
+                fd, temp_path = tempfile.mkstemp(dir=self.path, prefix=".entry-")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(data)
+                    os.replace(temp_path, self.path / entry)
+                except OSError:
+                    Path(temp_path).unlink(missing_ok=True)
+        except OSError as error:
+            self.disable(error)
+
+    def prune(self):
+        """Remove the expired entries, once per process."""
+        self._pruned = True
+        now = time.time()
+        for path in self.path.iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                if self.expired(path, now):
+                    path.unlink()
+            except OSError:
+                pass
+
+
+class YamlCryptValueCache:
+    """Decrypted values indexed by a keyed hash of their ciphertext and the identities.
+
+    The most recently used values are kept in memory, and in a disk cache when one is given,
+    so values which did not change are decrypted once across runs.
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE, disk=None):
+        self.size = size
+        self.disk = disk
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Worker processes start with an empty memory cache
+        return {"size": self.size, "disk": self.disk}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @staticmethod
+    def keys(value, identities):
+        secret = identities_secret(identities)
+        entry = hmac.new(secret, value.encode("utf-8"), hashlib.sha256).hexdigest()
+        return entry, hmac.new(secret, b"yamlcrypt-cache-key", hashlib.sha256).digest()
+
+    def get(self, value, identities):
+        """Return the decrypted value of a ciphertext, None when it is not cached."""
+        entry, key = self.keys(value, identities)
+        with self._lock:
+            if entry in self._values:
+                self._values.move_to_end(entry)
+                return self._values[entry]
+        decrypted = self.disk.get(entry, key) if self.disk else None
+        if decrypted is not None:
+            self.remember(entry, decrypted)
+        return decrypted
+
+    def set(self, value, identities, decrypted):
+        entry, key = self.keys(value, identities)
+        self.remember(entry, decrypted)
+        if self.disk:
+            self.disk.set(entry, key, decrypted)
+
+    def remember(self, entry, decrypted):
+        with self._lock:
+            self._values[entry] = decrypted
+            self._values.move_to_end(entry)
+            while len(self._values) > self.size:
+                self._values.popitem(last=False)
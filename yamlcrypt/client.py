@@ -0,0 +1,113 @@
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+from yamlcrypt import errors
+
+PROTOCOL_VERSION = 1
+
+
+def default_socket_path():
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or f"/tmp/yamlcrypt-{os.getuid()}"
+    return Path(runtime_dir) / "yamlcrypt.sock"
+
+
+def absolute(path):
+    # The daemon does not share the working directory of the client
+    return "-" if str(path) == "-" else str(Path(path).absolute())
+
+
+def is_private_directory(path):
+    """Return whether path is a directory owned by the current user, only accessible by them.
+
+    Raise OSError when it cannot be read.
+    """
+    stat = os.stat(path)
+    return stat.st_uid == os.getuid() and stat.st_mode & 0o777 == 0o700
+
+
+def error_from_response(error):
+    cls = getattr(errors, error["type"], None)
+    if not isinstance(cls, type) or not issubclass(cls, errors.YamlCryptError):
+        cls = errors.YamlCryptError
+    return cls(*error["args"])
+
+
+class YamlCryptClient:
+    """Send commands to a yamlcrypt serve daemon over its Unix socket.
+
+    Requests and responses are JSON objects, one per line. The first request checks that the
+    daemon runs the same version with the same config file, otherwise the caller should run
+    the commands itself.
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self._socket = None
+        self._file = None
+
+    def connect(self, config, version):
+        """Connect to the daemon, return False if it is not available for this config."""
+        try:
+            if Path(self.socket_path).stat().st_uid != os.getuid() or not is_private_directory(
+                Path(self.socket_path).parent
+            ):
+                # Values would be sent to a daemon run by another user, or one replacing it
+                return False
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(str(self.socket_path))
+            self._file = self._socket.makefile("rwb")
+            response = self.request("hello")
+        except (OSError, ValueError):
+            self.close()
+            return False
+        if response.get("version") != version or response.get("config") != absolute(config):
+            self.close()
+            return False
+        return True
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def request(self, command, **kwargs):
+        self._file.write(
+            json.dumps({"v": PROTOCOL_VERSION, "command": command, **kwargs}).encode("utf-8")
+        )
+        self._file.write(b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("The daemon closed the connection")
+        return json.loads(line)
+
+    def run(self, command, input, output=None, splice=False, fsync=None, stdin=None):
+        """Run a processor command on the daemon, return its log records, result, error and stats.
+
+        Standard streams are not shared with the daemon: stdin is sent with the request and
+        what the daemon writes to stdout is sent back.
+        """
+        response = self.request(
+            command,
+            input=absolute(input),
+            output=absolute(output) if output is not None else None,
+            data=(stdin or sys.stdin).read() if str(input) == "-" else None,
+            splice=splice,
+            fsync=fsync,
+        )
+        if response.get("data") is not None:
+            sys.stdout.write(response["data"])
+            sys.stdout.flush()
+        error = response.get("error")
+        return (
+            response.get("messages", []),
+            response.get("result"),
+            error_from_response(error) if error else None,
+            response.get("stats"),
+        )
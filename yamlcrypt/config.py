@@ -1,11 +1,14 @@
+import hashlib
+import json
 import os
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import pyrage
 from ruamel.yaml import YAML
-from yamlpath import YAMLPath
-from yamlpath.common import Parsers
+from ruamel.yaml.comments import CommentedMap
 
 from yamlcrypt.errors import (
     YamlCryptConfigNotFoundError,
@@ -13,6 +16,11 @@ from yamlcrypt.errors import (
     YamlCryptError,
 )
 from yamlcrypt.logger import logger
+from yamlcrypt.utils import load_yaml, yaml_editor
+from yamlcrypt.version import __version__
+
+if TYPE_CHECKING:
+    from yamlpath import YAMLPath
 
 PRIVATE_KEY_FORMAT = """# The private key for the recipient {recipient}
 {private}
@@ -31,15 +39,85 @@ def key_from_env(env_type, env_var):
         raise YamlCryptError("Unknown env variable type", env_type)
 
 
+# Segments of the paths made of keys and * wildcards, which are parsed without yamlpath
+SIMPLE_SEGMENT_RE = re.compile(r"[\w-]+|\*")
+
+
+def simple_path_keys(yaml_path):
+    """Return the keys of a path made of keys and * wildcards, None for any other path."""
+    separator = "/" if yaml_path.startswith("/") else "."
+    segments = yaml_path.removeprefix("/").split(separator)
+    if not all(SIMPLE_SEGMENT_RE.fullmatch(segment) for segment in segments):
+        return None
+    return tuple(None if segment == "*" else segment for segment in segments)
+
+
+def yamlpath_keys(yaml_path):
+    """Return the root key and keys of a path parsed by yamlpath, see YamlCryptRule.
+
+    yaml_path is a YAMLPath, its parsed segments are kept by it.
+    """
+    from yamlpath.enums import PathSegmentTypes
+    from yamlpath.exceptions import YAMLPathException
+
+    try:
+        segments = list(yaml_path.escaped)
+    except YAMLPathException as error:
+        raise YamlCryptError("Invalid yamlpath in rule", yaml_path.original) from error
+    top_level_key = None
+    if segments and segments[0][0] == PathSegmentTypes.KEY:
+        top_level_key = str(segments[0][1])
+    keys = None
+    if segments and all(
+        segment_type in (PathSegmentTypes.KEY, PathSegmentTypes.MATCH_ALL)
+        for segment_type, _ in segments
+    ):
+        keys = tuple(None if value is None else str(value) for _, value in segments)
+    return top_level_key, keys
+
+
 def format_env_var(env_type, name):
     return f"YAMLCRYPT_IDENTITIES_{env_type.upper()}_{name.upper()}"
 
 
-@dataclass
+@dataclass(frozen=True)
 class YamlCryptRule:
-    yaml_path: YAMLPath
+    yaml_path: str
     markup: str
-    recipients: list[str]
+    recipients: tuple[str, ...]
+    file_key: bool = False
+    files: tuple[str, ...] = ()
+    prefix: str = field(init=False)
+    top_level_key: str | None = field(init=False)
+    keys: tuple[str | None, ...] | None = field(init=False)
+    # The path parsed by yamlpath, only when a document needs it
+    _parsed_path: "YAMLPath | None" = field(init=False, default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "prefix", f"{self.markup}[")
+        object.__setattr__(self, "yaml_path", str(self.yaml_path))
+        # Keys of the path, None for a * wildcard, when it can be matched without yamlpath
+        keys = simple_path_keys(self.yaml_path)
+        if keys is None:
+            # Only other paths are parsed by yamlpath
+            top_level_key, keys = yamlpath_keys(self.parsed_path)
+        else:
+            top_level_key = keys[0]
+        # The root key the rule starts with, None when it can match any root key
+        object.__setattr__(self, "top_level_key", top_level_key)
+        object.__setattr__(self, "keys", keys)
+
+    @property
+    def parsed_path(self):
+        """The path parsed by yamlpath, parsed once for all the documents."""
+        if self._parsed_path is None:
+            from yamlpath import YAMLPath
+
+            object.__setattr__(self, "_parsed_path", YAMLPath(self.yaml_path))
+        return self._parsed_path
+
+    def applies_to(self, path):
+        return not self.files or any(Path(path).match(pattern) for pattern in self.files)
 
 
 class YamlCryptConfig:
@@ -47,38 +125,132 @@ class YamlCryptConfig:
 
     def __init__(self, log=None):
         self._config = {"yamlcrypt": {"identities": {}, "rules": []}}
-        self._yaml = Parsers.get_yaml_editor()
+        self._yaml = yaml_editor()
         self._log = log or logger()
         self._recipients = {}
         self._identities = {}
+        self._rules = None
+        self._rule_keys = {}
+        self._cache = None
+
+    def __getstate__(self):
+        # Only the loaded config and the already resolved keys are shared with worker processes
+        return {
+            "config": self._config,
+            "recipients": {name: str(recipient) for name, recipient in self._recipients.items()},
+            "identities": {name: str(identity) for name, identity in self._identities.items()},
+        }
+
+    def __setstate__(self, state):
+        self.__init__()
+        self._config = state["config"]
+        self._recipients = {
+            name: pyrage.x25519.Recipient.from_str(recipient)
+            for name, recipient in state["recipients"].items()
+        }
+        self._identities = {
+            name: pyrage.x25519.Identity.from_str(identity)
+            for name, identity in state["identities"].items()
+        }
 
     @property
     def config(self):
         return self._config["yamlcrypt"]
 
-    def iterate_rules(self):
-        for rule in self.config.get("rules", []):
-            yield YamlCryptRule(
-                yaml_path=YAMLPath(rule["yamlpath"]),
-                markup=rule.get("markup", self.DEFAULT_MARKUP),
-                recipients=rule["recipients"],
+    @property
+    def sidecar(self):
+        return bool(self.config.get("sidecar", False))
+
+    @property
+    def cache(self):
+        """The cache of decrypted values, None when it is not enabled."""
+        if self._cache is None:
+            cache = self.config.get("cache", False)
+            if not cache:
+                return None
+            # Only imported when the cache is enabled
+            from yamlcrypt.cache import (
+                DEFAULT_CACHE_SIZE,
+                DEFAULT_CACHE_TTL,
+                YamlCryptDiskCache,
+                YamlCryptValueCache,
+                default_cache_dir,
+            )
+
+            if not isinstance(cache, dict):
+                cache = {}
+            disk = None
+            if cache.get("dir"):
+                path = default_cache_dir() if cache["dir"] is True else Path(cache["dir"])
+                disk = YamlCryptDiskCache(
+                    path.expanduser(),
+                    ttl=int(cache.get("ttl", DEFAULT_CACHE_TTL)),
+                    log=self._log,
+                )
+            self._cache = YamlCryptValueCache(
+                size=int(cache.get("size", DEFAULT_CACHE_SIZE)), disk=disk
             )
+        return self._cache
+
+    @property
+    def rules(self):
+        """The rules of the config, compiled once."""
+        if self._rules is None:
+            self.compile_rules()
+        return self._rules
+
+    def compile_rules(self):
+        self._rules = tuple(self.compile_rule(rule) for rule in self.config.get("rules", []))
+        self._rule_keys = {}
+        return self._rules
+
+    def compile_rule(self, rule):
+        if "yamlpath" not in rule or "recipients" not in rule:
+            raise YamlCryptError("Rules need a yamlpath and recipients", dict(rule))
+        if not isinstance(rule.get("files", []), list):
+            raise YamlCryptError("Rule files should be a list of patterns", rule["files"])
+        # The path is parsed when the rule computes its keys
+        return YamlCryptRule(
+            yaml_path=str(rule["yamlpath"]),
+            markup=str(rule.get("markup", self.DEFAULT_MARKUP)),
+            recipients=tuple(str(recipient) for recipient in rule["recipients"]),
+            file_key=bool(rule.get("file_key", False)),
+            files=tuple(str(pattern) for pattern in rule.get("files", [])),
+        )
+
+    def check_recipients(self):
+        """Fail when a rule references a recipient without identity."""
+        for rule in self.rules:
+            for recipient in rule.recipients:
+                if recipient not in self.config.get("identities", {}):
+                    raise YamlCryptError("Unknown recipient in rule", recipient)
+        return self
 
-    def load(self, path: Path):
+    def iterate_rules(self, path=None):
+        for rule in self.rules:
+            if path is None or rule.applies_to(path):
+                yield rule
+
+    def load(self, path: Path, check_recipients=True):
         if not path.exists() or not path.is_file():
             raise YamlCryptConfigNotFoundError("File not found", path)
 
-        (tmp, doc_loaded) = Parsers.get_yaml_data(self._yaml, self._log, path)
+        (tmp, doc_loaded) = load_yaml(self._yaml, self._log, path)
         if not doc_loaded:
             raise YamlCryptError("Could not load config file", path)
 
         self._config = tmp
+        # Report invalid rules before any file is processed
+        self.compile_rules()
+        if check_recipients:
+            self.check_recipients()
         return self
 
     def save(self, path, recipients: dict[str, Path] | None = None):
-        yaml = YAML(typ="safe")
-        yaml.default_flow_style = False
         config = self._config.copy()
+        # Loaded configs can only be dumped by the round trip dumper, which keeps their layout
+        yaml = YAML() if isinstance(config, CommentedMap) else YAML(typ="safe")
+        yaml.default_flow_style = False
         for recipient, recipient_key_file in (recipients or {}).items():
             private = config["yamlcrypt"]["identities"][recipient]["private"]
             recipient_key_file.write_text(
@@ -134,6 +306,50 @@ class YamlCryptConfig:
                 self._recipients[name] = self.identity(name).to_public()
         return self._recipients[name]
 
+    def rule_recipients(self, rule):
+        key = ("recipients", rule.recipients)
+        if key not in self._rule_keys:
+            self._rule_keys[key] = [self.recipient(name=name) for name in rule.recipients]
+        return self._rule_keys[key]
+
+    def rule_identities(self, rule):
+        key = ("identities", rule.recipients)
+        if key not in self._rule_keys:
+            self._rule_keys[key] = [self.identity(name=name) for name in rule.recipients]
+        return self._rule_keys[key]
+
+    def digest(self):
+        """Hash of the config and of the public keys of its recipients.
+
+        Files processed with a config of another digest may have another result.
+        """
+        recipients = {}
+        for name in self.config.get("identities", {}):
+            try:
+                recipients[name] = str(self.recipient(name))
+            except (YamlCryptError, OSError):
+                # Without any key, nothing can be encrypted for this recipient
+                recipients[name] = None
+        data = json.dumps(
+            {"version": __version__, "config": self._config, "recipients": recipients},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def preload_keys(self, recipients=True, identities=True):
+        """Resolve the keys of every rule, so they are not read again for each file."""
+        for rule in self.rules:
+            try:
+                if recipients:
+                    self.rule_recipients(rule)
+                if identities:
+                    self.rule_identities(rule)
+            except (YamlCryptError, OSError):
+                # Reported when processing a file only if the key is actually needed
+                pass
+        return self
+
     def add_recipient(self, name):
         if name in self.config.get("identities"):
             raise YamlCryptDuplicateIdentify("An identity with this name already exists", name)
@@ -0,0 +1,81 @@
+import json
+import re
+
+from yamlcrypt.errors import YamlCryptError
+
+EXPORT_DOTENV = "dotenv"
+EXPORT_SHELL = "shell"
+EXPORT_JSON = "json"
+EXPORT_FORMATS = (EXPORT_DOTENV, EXPORT_SHELL, EXPORT_JSON)
+
+NAME_RE = re.compile(r"[^A-Za-z0-9]+")
+# Values written without quotes in dotenv files
+DOTENV_PLAIN_RE = re.compile(r"[A-Za-z0-9_./:@+,-]*")
+# Double quoted values are escaped, $ would start the interpolation of a variable
+DOTENV_ESCAPES = {
+    "\\": "\\\\",
+    '"': '\\"',
+    "$": "\\$",
+    "\n": "\\n",
+    "\r": "\\r",
+    "\t": "\\t",
+}
+
+
+def variable_name(path, prefix=""):
+    """Return the environment variable name of a YAML path, some.path[0] gives SOME_PATH_0."""
+    name = NAME_RE.sub("_", f"{prefix}{path}").strip("_").upper()
+    if not name or name[0].isdigit():
+        name = f"_{name}"
+    return name
+
+
+def add_values(values, exported):
+    """Add the exported path and value pairs to values, failing when a path is already there."""
+    for path, value in exported:
+        if path in values:
+            raise YamlCryptError("Value exported more than once", path)
+        values[path] = value
+    return values
+
+
+def variables(values, prefix=""):
+    """Return the values by environment variable name, failing when two paths share one."""
+    names = {}
+    result = {}
+    for path, value in values.items():
+        name = variable_name(path, prefix)
+        if name in names:
+            raise YamlCryptError(
+                f"{names[name]} and {path} are exported with the same variable name", name
+            )
+        names[name] = path
+        result[name] = value
+    return result
+
+
+def dotenv_quote(value):
+    if DOTENV_PLAIN_RE.fullmatch(value):
+        return value
+    if not any(char in value for char in "'\n\r"):
+        # Nothing is escaped or interpolated in single quoted values
+        return f"'{value}'"
+    return '"' + "".join(DOTENV_ESCAPES.get(char, char) for char in value) + '"'
+
+
+def format_export(values, fmt=EXPORT_DOTENV, prefix=""):
+    """Format plaintext values by YAML path as a dotenv file, a shell script or JSON."""
+    if fmt == EXPORT_JSON:
+        # Flat object keyed by YAML path
+        return json.dumps(values, ensure_ascii=False, indent=2)
+    if fmt == EXPORT_SHELL:
+        # Only imported by this format, the CLI imports this module for its choices
+        import shlex
+
+        return "\n".join(
+            f"export {name}={shlex.quote(value)}"
+            for name, value in variables(values, prefix).items()
+        )
+    return "\n".join(
+        f"{name}={dotenv_quote(value)}" for name, value in variables(values, prefix).items()
+    )
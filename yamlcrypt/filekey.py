@@ -0,0 +1,148 @@
+import base64
+import os
+import re
+import secrets
+
+import pyrage
+from ruamel.yaml.comments import CommentedMap
+from ruamel.yaml.scalarstring import LiteralScalarString
+
+from yamlcrypt.errors import YamlCryptError
+from yamlcrypt.utils import split_string_at_width
+
+FILE_KEYS_FIELD = "_yamlcrypt_keys"
+FILE_KEY_PREFIX = "@"
+# Key ids of the values encrypted with a file key, written after the markup
+FILE_KEY_ID_RE = re.compile(rf"\[{FILE_KEY_PREFIX}([^:\]\s]+):")
+NONCE_SIZE = 12
+KEY_SIZE = 32
+
+
+def cipher(key):
+    # cryptography is only imported when a rule uses a file key
+    from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+    return ChaCha20Poly1305(key)
+
+
+def encrypt_with_key(value, key_id, key):
+    nonce = os.urandom(NONCE_SIZE)
+    encrypted = cipher(key).encrypt(nonce, value.encode("utf-8"), key_id.encode())
+    return f"{FILE_KEY_PREFIX}{key_id}:{base64.b64encode(nonce + encrypted).decode('utf-8')}"
+
+
+def decrypt_with_key(value, key_id, key):
+    from cryptography.exceptions import InvalidTag
+
+    data = base64.b64decode(value)
+    try:
+        decrypted = cipher(key).decrypt(data[:NONCE_SIZE], data[NONCE_SIZE:], key_id.encode())
+    except InvalidTag as error:
+        raise YamlCryptError("Could not decrypt value with file key", key_id) from error
+    return decrypted.decode("utf-8")
+
+
+def is_file_key_value(value):
+    return value.startswith(FILE_KEY_PREFIX)
+
+
+def split_file_key_value(value):
+    key_id, _, data = value[len(FILE_KEY_PREFIX) :].partition(":")
+    return key_id, data
+
+
+class YamlCryptFileKeys:
+    """Data keys of a document, each wrapped once for a set of age recipients.
+
+    The wrapped keys are stored in the document under the FILE_KEYS_FIELD mapping so values
+    only need a symmetric encryption, and decryption only unwraps each key once per file.
+    """
+
+    def __init__(self, yaml_data):
+        self.yaml_data = yaml_data
+        self._new = {}
+        self._restored = {}
+        self._keys = {}
+
+    @property
+    def wrapped(self):
+        if isinstance(self.yaml_data, dict):
+            return self.yaml_data.get(FILE_KEYS_FIELD) or {}
+        return {}
+
+    def is_field(self, node_coordinate):
+        ancestry = node_coordinate.ancestry
+        return bool(ancestry) and ancestry[0][1] == FILE_KEYS_FIELD
+
+    def new_key(self, recipient_names, recipients):
+        """Return the key used to encrypt new values for the given recipients."""
+        if recipient_names not in self._new:
+            if not isinstance(self.yaml_data, dict):
+                raise YamlCryptError("File key mode requires a mapping document")
+            key_id = secrets.token_hex(4)
+            # A stored key with the same id would be replaced, and its values lost
+            while key_id in self.wrapped or key_id in self._keys or key_id in self._restored:
+                key_id = secrets.token_hex(4)
+            key = secrets.token_bytes(KEY_SIZE)
+            self._keys[key_id] = key
+            self._new[recipient_names] = (key_id, pyrage.encrypt(key, recipients))
+        key_id = self._new[recipient_names][0]
+        return key_id, self._keys[key_id]
+
+    def key(self, key_id, identities):
+        """Return the unwrapped key with the given id."""
+        if key_id not in self._keys:
+            wrapped = self.wrapped.get(key_id)
+            if not wrapped:
+                raise YamlCryptError("Could not find file key", key_id)
+            self._keys[key_id] = pyrage.decrypt(
+                base64.b64decode(str(wrapped).replace("\n", "")), identities
+            )
+        return self._keys[key_id]
+
+    def restore(self, key_id, wrapped):
+        """Add back a wrapped key used by a value encrypted in a previous run."""
+        self._restored[key_id] = wrapped
+
+    def referenced(self):
+        """Return the ids of the keys used by the encrypted values anywhere in the document.
+
+        Values are found whether or not a rule matches them, so keys of values out of the
+        scope of the current rules are kept.
+        """
+        referenced = set()
+        stack = [value for key, value in self.yaml_data.items() if key != FILE_KEYS_FIELD]
+        while stack:
+            data = stack.pop()
+            if isinstance(data, dict):
+                stack.extend(data.values())
+            elif isinstance(data, list):
+                stack.extend(data)
+            elif isinstance(data, str) and FILE_KEY_PREFIX in data:
+                referenced.update(FILE_KEY_ID_RE.findall(data.replace("\n", "")))
+        return referenced
+
+    def store(self):
+        """Write the keys still used by encrypted values to the document."""
+        if not isinstance(self.yaml_data, dict):
+            return False
+        if not self.wrapped and not self._restored and not self._new:
+            return False
+        keys = CommentedMap(self.wrapped.items())
+        for key_id, wrapped in self._restored.items():
+            keys.setdefault(key_id, LiteralScalarString(wrapped))
+        for key_id, wrapped in self._new.values():
+            keys[key_id] = LiteralScalarString(
+                split_string_at_width(base64.b64encode(wrapped).decode("utf-8"))
+            )
+        referenced = self.referenced()
+        for key_id in list(keys):
+            if key_id not in referenced:
+                del keys[key_id]
+        if keys == self.wrapped:
+            return False
+        if keys:
+            self.yaml_data[FILE_KEYS_FIELD] = keys
+        else:
+            del self.yaml_data[FILE_KEYS_FIELD]
+        return True
@@ -1,16 +1,65 @@
 from types import SimpleNamespace
+from typing import TYPE_CHECKING
 
-from yamlpath.wrappers import ConsolePrinter
+if TYPE_CHECKING:
+    from yamlpath.wrappers import ConsolePrinter
 
 
-def logger(quiet=False, verbose=False, debug=False) -> ConsolePrinter:
-    return ConsolePrinter(SimpleNamespace(quiet=quiet, verbose=verbose, debug=debug))
+class YamlCryptLogger:
+    """The console printer of yamlpath, only imported when a message is printed."""
+
+    def __init__(self, args):
+        self.args = args
+        self._printer = None
+
+    @property
+    def printer(self) -> "ConsolePrinter":
+        if self._printer is None:
+            from yamlpath.wrappers import ConsolePrinter
+
+            self._printer = ConsolePrinter(self.args)
+        return self._printer
+
+    def info(self, message):
+        self.printer.info(message)
+
+    def verbose(self, message):
+        if self.args.verbose or self.args.debug:
+            self.printer.verbose(message)
+
+    def warning(self, message):
+        self.printer.warning(message)
+
+    def error(self, message, exit_code=None):
+        self.printer.error(message, exit_code=exit_code)
+
+    def critical(self, message, exit_code=1):
+        self.printer.critical(message, exit_code=exit_code)
+
+    def debug(self, message, **kwargs):
+        if self.args.debug:
+            self.printer.debug(message, **kwargs)
+
+
+def logger(quiet=False, verbose=False, debug=False):
+    return YamlCryptLogger(SimpleNamespace(quiet=quiet, verbose=verbose, debug=debug))
 
 
 class DelayedLogger:
-    def __init__(self, logger):
+    def __init__(self, logger, messages=None):
         self.logger = logger
-        self.messages = []
+        self.messages = messages or []
+
+    @classmethod
+    def load(cls, logger, records):
+        """Build a delayed logger from messages serialized with records."""
+        return cls(
+            logger, [(getattr(logger, name), message, args) for name, message, args in records]
+        )
+
+    def records(self):
+        """Return the messages with the name of their level, to be sent to another process."""
+        return [(fct.__name__, message, args) for fct, message, args in self.messages]
 
     def dump(self):
         for fct, message, args in self.messages:
@@ -32,7 +81,9 @@ class DelayedLogger:
         self.messages.append((self.logger.error, message, {"exit_code": exit_code}))
 
     def critical(self, message, exit_code=1):
-        self.messages.append((self.logger.error, message, {"exit_code": exit_code}))
+        self.messages.append((self.logger.critical, message, {"exit_code": exit_code}))
 
     def debug(self, message, **kwargs):
-        self.messages.append((self.logger.error, message, kwargs))
+        # Debug messages are very frequent, only keep them when they would be printed
+        if self.logger.args.debug:
+            self.messages.append((self.logger.debug, message, kwargs))
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from yamlcrypt.output import file_digest
+
+MANIFEST_VERSION = 1
+# State of the files after a successful command
+STATE_ENCRYPTED = "encrypted"
+STATE_DECRYPTED = "decrypted"
+COMMAND_STATES = {"encrypt": STATE_ENCRYPTED, "check": STATE_ENCRYPTED, "decrypt": STATE_DECRYPTED}
+
+
+def default_manifest_path(config_path):
+    return Path(config_path).with_name(".yamlcrypt.manifest.json")
+
+
+class YamlCryptManifest:
+    """Content hash and state of the files after the last successful command.
+
+    A file whose content and config did not change since it was encrypted (or decrypted) is
+    already in the state the command would leave it in, so it does not need to be processed.
+    """
+
+    def __init__(self, path, config_digest):
+        self.path = Path(path)
+        self.config_digest = config_digest
+        self.files = {}
+
+    def load(self):
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return self
+        if data.get("version") == MANIFEST_VERSION:
+            self.files = data.get("files", {})
+        return self
+
+    def save(self):
+        data = json.dumps(
+            {"version": MANIFEST_VERSION, "files": self.files}, indent=2, sort_keys=True
+        )
+        fd, temp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+    @staticmethod
+    def key(path):
+        return str(Path(path).absolute())
+
+    def unchanged(self, path, command):
+        """Whether the file is already in the state command leaves it in."""
+        entry = self.files.get(self.key(path))
+        if not entry or entry.get("state") != COMMAND_STATES[command]:
+            return False
+        if entry.get("config") != self.config_digest:
+            return False
+        try:
+            return entry.get("hash") == file_digest(Path(path)).hex()
+        except OSError:
+            return False
+
+    def record(self, path, command):
+        try:
+            digest = file_digest(Path(path)).hex()
+        except OSError:
+            self.forget(path)
+            return
+        self.files[self.key(path)] = {
+            "hash": digest,
+            "config": self.config_digest,
+            "state": COMMAND_STATES[command],
+        }
+
+    def forget(self, path):
+        self.files.pop(self.key(path), None)
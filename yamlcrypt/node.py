@@ -1,3 +1,6 @@
+import json
+import threading
+
 from ruamel.yaml import YAML
 from ruamel.yaml.scalarstring import (
     DoubleQuotedScalarString,
@@ -6,14 +9,33 @@ from ruamel.yaml.scalarstring import (
     SingleQuotedScalarString,
 )
 
+from yamlcrypt.errors import YamlCryptError
+
+ENVELOPE_VERSION = 1
+
+_local = threading.local()
+
 
 def get_yaml():
-    yaml = YAML(typ=["rt", "string"])
-    yaml.explicit_end = False
-    yaml.explicit_start = False
+    # YAML instances are costly to build and not thread-safe, keep one per thread
+    yaml = getattr(_local, "yaml", None)
+    if yaml is None:
+        yaml = YAML(typ=["rt", "string"])
+        yaml.explicit_end = False
+        yaml.explicit_start = False
+        _local.yaml = yaml
     return yaml
 
 
+def quoted_data(value, style):
+    """Return the raw text between the quotes of a quoted scalar with this value."""
+    if style == '"':
+        # JSON escape sequences are valid in double quoted scalars
+        return json.dumps(value, ensure_ascii=False)[1:-1]
+    # Line breaks of single quoted scalars are written as empty lines
+    return value.replace("'", "''").replace("\n", "\n\n")
+
+
 class YamlCryptNode:
     __slots__ = ("style", "data", "fold_pos")
 
@@ -24,27 +46,40 @@ class YamlCryptNode:
 
     @classmethod
     def from_string(cls, data):
-        obj = get_yaml().load(data)
+        if data.startswith("{"):
+            obj = json.loads(data)
+        else:
+            # Legacy envelope serialized as a YAML mapping
+            obj = get_yaml().load(data)
+        if obj.get("v", ENVELOPE_VERSION) > ENVELOPE_VERSION:
+            raise YamlCryptError("Unsupported value envelope version", obj["v"])
         return cls(style=obj["s"], data=obj["d"], fold_pos=obj.get("f"))
 
     @classmethod
-    def from_node_coordinate(cls, node_coordinate, lines):
+    def from_node_coordinate(cls, node_coordinate, source):
         def data_from_raw():
+            lines = source.lines
             key_name = node_coordinate.parentref
             val_line = node_coordinate.parent.lc.value(key_name)[0]
             val_col = node_coordinate.parent.lc.value(key_name)[1]
 
-            for parent, parentref in reversed(node_coordinate.ancestry):
-                keys = list(parent.keys())
-                if parentref in keys[:-1]:
-                    next_node = keys[keys.index(parentref) + 1]
-                    next_node_parent = parent
-                    break
-            end_line = next_node_parent.lc.key(next_node)[0] - 1
-
-            candidates = [lines[val_line][val_col:]] + [
-                line.lstrip() for line in lines[val_line + 1 : end_line]
-            ]
+            end = source.quoted_end(val_line, val_col)
+            if end is None:
+                next_line = source.next_line(node_coordinate)
+                end_line = next_line - 1 if next_line is not None else None
+                candidates = [lines[val_line][val_col:]] + [
+                    line.lstrip() for line in lines[val_line + 1 : end_line]
+                ]
+            else:
+                # Document markers and comments following the scalar are left out
+                end_line, end_col = end
+                candidates = [lines[val_line][val_col:]] + [
+                    line.lstrip() for line in lines[val_line + 1 : end_line + 1]
+                ]
+                if end_line == val_line:
+                    candidates = [lines[val_line][val_col : end_col + 1]]
+                else:
+                    candidates[-1] = lines[end_line][: end_col + 1].lstrip()
             data_lines = [line[:-1] if line[-1] == "\\" else line for line in candidates if line]
             data = "\n".join(data_lines)
             return data
@@ -53,7 +88,12 @@ class YamlCryptNode:
         if isinstance(node_coordinate.node, SingleQuotedScalarString) or isinstance(
             node_coordinate.node, DoubleQuotedScalarString
         ):
-            data = data_from_raw()[1:-1]
+            # Without the raw text, the value is quoted as it would have been written
+            data = (
+                data_from_raw()[1:-1]
+                if source
+                else quoted_data(str(node_coordinate.node), node_coordinate.node.style)
+            )
         elif isinstance(node_coordinate.node, LiteralScalarString):
             data = str(node_coordinate.node)
         elif isinstance(node_coordinate.node, FoldedScalarString):
@@ -75,7 +115,9 @@ class YamlCryptNode:
         return d
 
     def to_string(self):
-        return get_yaml().dump_to_string(self.to_dict(), add_final_eol=False)
+        return json.dumps(
+            {"v": ENVELOPE_VERSION, **self.to_dict()}, ensure_ascii=False, separators=(",", ":")
+        )
 
     def to_rueyaml(self):
         fct = None
@@ -92,3 +134,10 @@ class YamlCryptNode:
         elif self.style == "|":
             fct = LiteralScalarString
         return fct(self.data)
+
+    def to_value(self):
+        """Return the plaintext value, without the escape sequences of quoted styles."""
+        if self.style in ("'", '"'):
+            # Quoted data is the raw text between the quotes
+            return str(get_yaml().load(f"{self.style}{self.data}{self.style}"))
+        return str(self.data)
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import stat
+import sys
+import tempfile
+
+from yamlcrypt.source import STDIO
+from yamlcrypt.stats import YamlCryptStats
+
+# When written files are flushed to disk before replacing the previous ones
+FSYNC_NONE = "none"
+FSYNC_FILE = "file"
+FSYNC_FULL = "full"
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_FILE, FSYNC_FULL)
+
+CHUNK_SIZE = 1 << 16
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def fsync_directory(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def default_mode():
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+class YamlCryptOutput:
+    """Destination of the processed documents, written as soon as each one is processed.
+
+    Documents are streamed to stdout directly. Files are written to a temporary file
+    next to them which atomically replaces the file when a document was changed and the
+    content differs from the existing file, so readers never see a partially written file.
+    Symbolic links are followed, the file they point to is replaced.
+    """
+
+    def __init__(self, path, stdout=None, fsync=FSYNC_FILE, stats=None):
+        self.path = path if path == STDIO else path.resolve()
+        self.stdout = stdout or sys.stdout
+        self.fsync = fsync
+        self.stats = stats or YamlCryptStats()
+        self.changed = False
+        self._file = None
+        self._digest = hashlib.sha256()
+        self._size = 0
+
+    def __enter__(self):
+        if self.path != STDIO:
+            self._file = tempfile.NamedTemporaryFile(
+                "wb",
+                dir=self.path.parent,
+                prefix=f".{self.path.name}.",
+                delete=False,
+            )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self.stats.phase("write"):
+            self.close(replace=exc_type is None)
+
+    def close(self, replace=True):
+        """Replace the file with the written content, unless it is unchanged."""
+        if self._file is None:
+            self.stdout.flush()
+            return
+        replace = replace and self.changed and not self.unchanged()
+        if replace and self.fsync != FSYNC_NONE:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+        if not replace:
+            os.unlink(self._file.name)
+            return
+        if self.path.exists():
+            os.chmod(self._file.name, stat.S_IMODE(self.path.stat().st_mode))
+        else:
+            os.chmod(self._file.name, default_mode())
+        os.replace(self._file.name, self.path)
+        if self.fsync == FSYNC_FULL:
+            # Persist the rename itself
+            fsync_directory(self.path.parent)
+
+    def unchanged(self):
+        """Whether the written content is identical to the existing file."""
+        # Identical files are not replaced so their mtime does not change
+        if not self.path.is_file() or self.path.stat().st_size != self._size:
+            return False
+        return file_digest(self.path) == self._digest.digest()
+
+    def write(self, data, changed=False):
+        with self.stats.phase("write"):
+            self.changed = self.changed or changed
+            if self._file is None:
+                self.stdout.write(data)
+                self.stdout.flush()
+                self.stats.count("bytes_out", len(data.encode("utf-8")))
+            else:
+                # Newlines are translated as in files opened in text mode
+                encoded = data.replace("\n", os.linesep).encode("utf-8")
+                self._digest.update(encoded)
+                self._size += len(encoded)
+                self._file.write(encoded)
+                self.stats.count("bytes_out", len(encoded))
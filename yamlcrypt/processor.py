@@ -1,114 +1,559 @@
 import base64
+import io
+import re
+from collections.abc import Set as AbstractSet
 from dataclasses import dataclass
 from pathlib import Path
+from types import SimpleNamespace
+from typing import TextIO
 
 import pyrage
 from ruamel.yaml import YAML
-from ruamel.yaml.scalarstring import (
-    LiteralScalarString,
-)
-from yamlpath import Processor as YAMLProcessor
-from yamlpath.common import Parsers
+from ruamel.yaml.comments import CommentedMap
+from ruamel.yaml.scalarstring import LiteralScalarString, PlainScalarString
 
 from yamlcrypt.config import YamlCryptConfig
 from yamlcrypt.errors import YamlCryptError
+from yamlcrypt.filekey import (
+    FILE_KEYS_FIELD,
+    YamlCryptFileKeys,
+    decrypt_with_key,
+    encrypt_with_key,
+    is_file_key_value,
+    split_file_key_value,
+)
 from yamlcrypt.logger import logger
-from yamlcrypt.node import YamlCryptNode
+from yamlcrypt.node import YamlCryptNode, get_yaml
+from yamlcrypt.output import FSYNC_FILE, YamlCryptOutput
+from yamlcrypt.sidecar import YamlCryptSidecar, sidecar_path, value_digest
+from yamlcrypt.source import STDIO, YamlCryptSource, iterate_documents, read_lines
+from yamlcrypt.stats import YamlCryptStats
+from yamlcrypt.utils import load_yaml, split_string_at_width, yaml_editor
 
-
-def split_string_at_width(text, width=80):
-    return "\n".join(text[i : i + width] for i in range(0, len(text), width))
+# Root keys, quoted keys may contain escaped quotes and plain keys colons not followed by a space
+ROOT_KEY_RE = re.compile(
+    r"""(?:"((?:[^"\\]|\\.)*)"|'((?:[^']|'')*)'|([^\s#'"](?:[^:]|:(?![ \t]|$))*?))"""
+    r"""[ \t]*:(?:[ \t]|$)"""
+)
+# Line width used by ruamel.yaml when dumping
+DUMP_WIDTH = 80
+UNKNOWN_ROOT_STARTS = ("{", "[", "?", "&", "*", "!", "<<", "-", "|", ">")
 
 
 def encrypt_value(value, recipients):
     return base64.b64encode(pyrage.encrypt(value.encode("utf-8"), recipients)).decode("utf-8")
 
 
-def decrypt_value(value, identities):
-    return pyrage.decrypt(base64.b64decode(value), identities).decode("utf-8")
+def decrypt_value(value, identities, cache=None):
+    decrypted = cache.get(value, identities) if cache else None
+    if decrypted is None:
+        decrypted = pyrage.decrypt(base64.b64decode(value), identities).decode("utf-8")
+        if cache:
+            cache.set(value, identities, decrypted)
+    return decrypted
+
+
+def root_key(line):
+    """Return the root key of a line, None when it cannot be read with certainty."""
+    match = ROOT_KEY_RE.match(line)
+    if not match:
+        return None
+    double_quoted, single_quoted, plain = match.groups()
+    if double_quoted is not None:
+        # Escape sequences are left to the parser
+        return None if "\\" in double_quoted else double_quoted
+    if single_quoted is not None:
+        return single_quoted.replace("''", "'")
+    if " #" in plain or "\t#" in plain:
+        return None
+    return plain
+
+
+def may_match(text, rules):
+    """Cheap scan of the raw text telling if any of the rules can match a node.
+
+    Only the root keys are looked at. Whenever the document layout cannot be
+    understood without parsing, the rules are considered as possibly matching:
+    this scan must never skip a document with matching nodes.
+    """
+    keys = set()
+    for rule in rules:
+        if rule.top_level_key is None:
+            return True
+        keys.add(rule.top_level_key)
+    if not keys:
+        return False
+
+    root_found = False
+    for line in text.removeprefix("\ufeff").splitlines():
+        content = line.lstrip()
+        if not content or content.startswith("#"):
+            continue
+        if line.startswith(("---", "...")):
+            if line[3:].strip() and not line[3:].lstrip().startswith("#"):
+                return True
+            root_found = False
+            continue
+        if line.startswith("%"):
+            continue
+        if line[0] in " \t":
+            if not root_found:
+                return True
+            continue
+        root_found = True
+        if line.startswith(UNKNOWN_ROOT_STARTS):
+            return True
+        key = root_key(line)
+        if key is None or key in keys:
+            return True
+    return False
+
+
+# Characters escaped by yamlpath in path segments, with both path separators
+PATH_SPECIAL_CHARS = frozenset("\\./()[]^$%'\" ")
+
+
+# Keys written as is in the paths of the nodes, the others are written by yamlpath
+SIMPLE_KEY_RE = re.compile(r"[\w-]+")
+
+
+def escape_key(key, separator):
+    from yamlpath import YAMLPath
+
+    key = str(key)
+    if PATH_SPECIAL_CHARS.isdisjoint(key):
+        return key
+    return YAMLPath.escape_path_section(key, separator)
+
+
+class YamlCryptPath:
+    """Path of a node found by the matcher, written as the path yamlpath builds for it."""
+
+    __slots__ = ("parent", "key", "index", "_string")
+
+    def __init__(self, parent=None, key=None, index=False):
+        self.parent = parent
+        self.key = key
+        # Whether key is the index of an element of a sequence
+        self.index = index
+        self._string = None
+
+    def segments(self):
+        path = self
+        segments = []
+        while path.parent is not None:
+            segments.append((path.key, path.index))
+            path = path.parent
+        return segments[::-1]
+
+    def __str__(self):
+        if self._string is None:
+            segments = self.segments()
+            if all(index or SIMPLE_KEY_RE.fullmatch(str(key)) for key, index in segments):
+                self._string = "".join(
+                    f"[{key}]" if index else f"{'.' if position else ''}{key}"
+                    for position, (key, index) in enumerate(segments)
+                )
+            else:
+                # Keys with special characters are escaped and written by yamlpath
+                from yamlpath import YAMLPath
+
+                path = YAMLPath("")
+                for key, index in segments:
+                    path = path + (f"[{key}]" if index else escape_key(key, path.separator))
+                self._string = str(path)
+        return self._string
+
+
+class YamlCryptNodeCoords:
+    """A node with its parent and path, as the node coordinates of yamlpath."""
+
+    __slots__ = ("node", "parent", "parentref", "path", "ancestry")
+
+    def __init__(self, node, parent, parentref, path, ancestry):
+        self.node = node
+        self.parent = parent
+        self.parentref = parentref
+        self.path = path
+        self.ancestry = ancestry
+
+
+def match_key(key):
+    """Return the rule key matching a mapping key, as yamlpath compares keys."""
+    if isinstance(key, str):
+        return key
+    if isinstance(key, int) and not isinstance(key, bool):
+        return str(key)
+    return None
+
+
+class YamlCryptMatchNode:
+    """A node of the tree of rule keys, with the rules ending there and the keys following it."""
+
+    __slots__ = ("children", "wildcard", "rules", "below")
+
+    def __init__(self):
+        self.children = {}
+        self.wildcard = None
+        # Index of the rules ending at this node, and of the rules going below it
+        self.rules = []
+        self.below = []
+
+    def child(self, key):
+        if key is None:
+            self.wildcard = self.wildcard or YamlCryptMatchNode()
+            return self.wildcard
+        return self.children.setdefault(key, YamlCryptMatchNode())
+
+
+class YamlCryptMatcher:
+    """Find the nodes matched by the rules, walking the document once for the simple rules.
+
+    Rules made of keys and single level * wildcards are matched together by a single walk of
+    the document. The other rules, and the simple rules meeting a sequence where a key is
+    expected (yamlpath then searches the key in each element), are matched with yamlpath.
+    A node matched by several rules is only matched by the first one.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.root = YamlCryptMatchNode()
+        self.complex = set()
+        for index, rule in enumerate(self.rules):
+            if rule.keys is None:
+                self.complex.add(index)
+                continue
+            node = self.root
+            for key in rule.keys:
+                node.below.append(index)
+                node = node.child(key)
+            node.rules.append(index)
+
+    def iterate_nodes(self, yaml_data, processor):
+        """Yield the rule and node coordinate of each node matched by a rule.
+
+        processor is the yamlpath processor of the document, or a function returning it,
+        only called when some rules need yamlpath.
+        """
+        matches = {}
+        fallback = set()
+        self.walk(yaml_data, self.root, YamlCryptPath(), [], matches, fallback)
+        if self.complex or fallback:
+            from yamlpath.exceptions import YAMLPathException
+
+            if callable(processor):
+                processor = processor()
+        for index in sorted(self.complex | fallback):
+            try:
+                # Unlike mustexist=False, missing paths are not created in the document
+                for node_coordinate in processor.get_nodes(
+                    self.rules[index].parsed_path, mustexist=True
+                ):
+                    self.add_match(matches, index, node_coordinate)
+            except YAMLPathException:
+                pass
+        for index, node_coordinate in matches.values():
+            yield self.rules[index], node_coordinate
+
+    @staticmethod
+    def add_match(matches, index, node_coordinate):
+        key = (id(node_coordinate.parent), node_coordinate.parentref)
+        if key not in matches or matches[key][0] > index:
+            matches[key] = (index, node_coordinate)
+
+    def walk(self, data, node, path, ancestry, matches, fallback):
+        if isinstance(data, dict):
+            if node.wildcard is None:
+                items = self.lookup(data, node.children)
+            else:
+                items = data.items()
+            for key, value in items:
+                targets = [] if node.wildcard is None else [node.wildcard]
+                child = node.children.get(match_key(key))
+                if child is not None:
+                    targets.append(child)
+                self.visit(data, key, value, targets, path, ancestry, matches, fallback)
+        elif isinstance(data, list):
+            for key, child in node.children.items():
+                if not key.isdigit():
+                    fallback.update(child.below, child.rules)
+                elif int(key) < len(data):
+                    index = int(key)
+                    self.visit(data, index, data[index], [child], path, ancestry, matches, fallback)
+            if node.wildcard is not None:
+                for index, value in enumerate(data):
+                    self.visit(
+                        data, index, value, [node.wildcard], path, ancestry, matches, fallback
+                    )
+        elif isinstance(data, AbstractSet):
+            fallback.update(node.below)
+
+    @staticmethod
+    def lookup(data, children):
+        for key in children:
+            if key in data:
+                yield key, data[key]
+            elif key.isdigit() and int(key) in data:
+                yield int(key), data[int(key)]
+
+    def visit(self, data, key, value, targets, path, ancestry, matches, fallback):
+        # Paths and ancestry are built as yamlpath builds them, node ids must not change
+        next_path = YamlCryptPath(path, key, index=isinstance(data, list))
+        next_ancestry = ancestry + [(data, key)]
+        for target in targets:
+            for index in target.rules:
+                self.add_match(
+                    matches,
+                    index,
+                    YamlCryptNodeCoords(value, data, key, next_path, next_ancestry),
+                )
+            if target.children or target.wildcard is not None:
+                self.walk(value, target, next_path, next_ancestry, matches, fallback)
 
 
 @dataclass
 class YamlCryptProcessorArgs:
     input: Path
     output: Path | None = None
+    # Write changed values in the original text instead of dumping changed documents
+    splice: bool = False
+    fsync: str = FSYNC_FILE
+    # Streams used when input or output is "-", sys.stdin and sys.stdout by default
+    stdin: TextIO | None = None
+    stdout: TextIO | None = None
+    # Path of the content read from stdin, only used to select the file scoped rules
+    stdin_path: Path | None = None
 
+    @property
+    def output_path(self):
+        if self.output is None and self.input == STDIO:
+            return STDIO
+        return self.output or self.input
 
-class YamlCryptProcessor:
-    def __init__(self, args: YamlCryptProcessorArgs, config: YamlCryptConfig, log=None):
-        self._args = args
+    @property
+    def rules_path(self):
+        return self.stdin_path if self.input == STDIO else self.input
+
+
+class YamlCryptDocument:
+    """A document of the input, processed independently of the other documents."""
+
+    def __init__(
+        self, text, index, rules, config, log, matcher=None, data=None, stats=None, skip=True
+    ):
+        self.index = index
+        self.rules = rules
+        self.matcher = matcher or YamlCryptMatcher(rules)
+        self.stats = stats or YamlCryptStats()
         self._config = config
-        self._log = log or logger()
-        self.yaml = Parsers.get_yaml_editor()
+        self._log = log
+        self.yaml = yaml_editor()
+        if data is None:
+            self.source = YamlCryptSource(text)
+            self.skipped = skip and not may_match(text, rules)
+
+            (self.yaml_data, doc_loaded) = load_yaml(
+                self.yaml, self._log, "" if self.skipped else text
+            )
+            if not doc_loaded:
+                raise YamlCryptError("Could not load document", index)
+            self.yaml.explicit_start = self.source.explicit_start
+            self.yaml.explicit_end = self.source.explicit_end
+        else:
+            # Parsed by the caller, there is no raw text to recover scalars from or splice into
+            self.source = None
+            self.skipped = False
+            self.yaml_data = data
 
-        (self.yaml_data, doc_loaded) = Parsers.get_yaml_data(self.yaml, self._log, args.input)
-        if not doc_loaded:
-            raise YamlCryptError("Could not load input file", str(args.input))
+        self._processor = None
+        self.file_keys = YamlCryptFileKeys(self.yaml_data)
+        # Parent collection and key of the values replaced in the document
+        self.replaced = []
 
-        self.processor = YAMLProcessor(self._log, self.yaml_data)
-        self.lines = args.input.read_text().splitlines()
-        self.yaml.explicit_end = False
-        for line in reversed(self.lines):
-            if line.startswith("..."):
-                self.yaml.explicit_end = True
-            if len(line.strip()):
-                break
+    @property
+    def processor(self):
+        """The yamlpath processor of the document, only created for the rules needing it."""
+        if self._processor is None:
+            from yamlpath import Processor as YAMLProcessor
+
+            self._processor = YAMLProcessor(self._log, self.yaml_data)
+        return self._processor
 
     def __iterate_nodes(self):
-        for rule in self._config.iterate_rules():
-            for node_coordinate in self.processor.get_nodes(rule.yaml_path, mustexist=False):
+        nodes = self.matcher.iterate_nodes(self.yaml_data, lambda: self.processor)
+        for rule, node_coordinate in self.stats.iterate("match", nodes):
+            if not self.file_keys.is_field(node_coordinate):
+                self.stats.count("nodes_matched")
                 yield rule, node_coordinate
 
-    def encrypt(self):
+    def node_id(self, node_coordinate):
+        """Identify a node of the input, in any of its documents."""
+        if self.index:
+            return f"{node_coordinate.path} (document {self.index + 1})"
+        return str(node_coordinate.path)
+
+    def encrypt(self, sidecar=None):
         should_dump = False
         for rule, node_coordinate in self.__iterate_nodes():
-            starts = f"{rule.markup}["
+            if not isinstance(node_coordinate.node, str):
+                self.stats.count("values_skipped")
+                continue
+            if node_coordinate.node.startswith(rule.prefix):
+                self.stats.count("values_skipped")
+                continue
+
+            should_dump = True
+            value = YamlCryptNode.from_node_coordinate(
+                node_coordinate=node_coordinate, source=self.source
+            ).to_string()
+            recipients = self._config.rule_recipients(rule)
+            encrypted = sidecar and sidecar.lookup(
+                self.node_id(node_coordinate), value_digest(recipients, value)
+            )
+            if encrypted:
+                if is_file_key_value(encrypted):
+                    key_id = split_file_key_value(encrypted)[0]
+                    self.file_keys.restore(key_id, sidecar.keys[key_id])
+            else:
+                with self.stats.phase("crypto"):
+                    if rule.file_key:
+                        key_id, key = self.file_keys.new_key(rule.recipients, recipients)
+                        encrypted = encrypt_with_key(value, key_id, key)
+                    else:
+                        encrypted = encrypt_value(value, recipients)
+            self.stats.count("values_encrypted")
+            node_coordinate.parent[node_coordinate.parentref] = LiteralScalarString(
+                split_string_at_width(f"{rule.prefix}{encrypted}]")
+            )
+            self.replaced.append((node_coordinate.parent, node_coordinate.parentref))
+        return self.store_file_keys() or should_dump
+
+    def check(self):
+        unencrypted = []
+        for rule, node_coordinate in self.__iterate_nodes():
             if isinstance(node_coordinate.node, str) and not node_coordinate.node.startswith(
-                starts
+                rule.prefix
             ):
-                should_dump = True
-                encrypted = encrypt_value(
-                    YamlCryptNode.from_node_coordinate(
-                        node_coordinate=node_coordinate, lines=self.lines
-                    ).to_string(),
-                    [self._config.recipient(name=recipient) for recipient in rule.recipients],
-                )
-                node_coordinate.parent[node_coordinate.parentref] = LiteralScalarString(
-                    split_string_at_width(f"{rule.markup}[{encrypted}]")
-                )
-        if should_dump:
-            self.dump()
+                unencrypted.append(self.node_id(node_coordinate))
+        return unencrypted
 
-    def decrypt(self):
+    @staticmethod
+    def encrypted_data(rule, node):
+        """Return the encrypted data of a node, None when it is not encrypted."""
+        if isinstance(node, str) and node.startswith(rule.prefix) and node.endswith("]"):
+            return node[len(rule.prefix) : -1].replace("\n", "")
+        return None
+
+    def decrypt_data(self, rule, encrypted):
+        """Return the envelope of an encrypted value."""
+        identities = self._config.rule_identities(rule)
+        with self.stats.phase("crypto"):
+            if is_file_key_value(encrypted):
+                key_id, data = split_file_key_value(encrypted)
+                decrypted = decrypt_with_key(data, key_id, self.file_keys.key(key_id, identities))
+            else:
+                decrypted = decrypt_value(encrypted, identities, cache=self._config.cache)
+        self.stats.count("values_decrypted")
+        return decrypted
+
+    def set_decrypted(self, node_coordinate, node, raw=True):
+        """Replace an encrypted value by its decrypted node.
+
+        Quoted values are set with the raw text they were written with, to be dumped as is,
+        unless raw is False or there is no raw text to write back.
+        """
+        if not raw or self.source is None:
+            node = YamlCryptNode(node.style, node.to_value(), node.fold_pos)
+        node = node.to_rueyaml()
+        if hasattr(node, "style"):
+            node_coordinate.parent[node_coordinate.parentref] = node
+        else:
+            # Assigning a str would keep the literal style of the encrypted value
+            node_coordinate.parent[node_coordinate.parentref] = PlainScalarString(node)
+
+    def decrypt(self, sidecar=None):
         should_dump = False
         for rule, node_coordinate in self.__iterate_nodes():
-            starts = f"{rule.markup}["
-            ends = "]"
-            if (
-                isinstance(node_coordinate.node, str)
-                and node_coordinate.node.startswith(starts)
-                and node_coordinate.node.endswith(ends)
-            ):
+            encrypted = self.encrypted_data(rule, node_coordinate.node)
+            if encrypted is not None:
                 should_dump = True
-                decrypted = decrypt_value(
-                    (node_coordinate.node[len(f"{rule.markup}[") : -1]).replace("\n", ""),
-                    [self._config.identity(name=recipient) for recipient in rule.recipients],
-                )
-                node = YamlCryptNode.from_string(decrypted).to_rueyaml()
-                if hasattr(node, "style"):
-                    node_coordinate.parent[node_coordinate.parentref] = node
-                else:
-                    self.processor.set_value(node_coordinate.path, node)
+                decrypted = self.decrypt_data(rule, encrypted)
+                if sidecar and is_file_key_value(encrypted):
+                    key_id = split_file_key_value(encrypted)[0]
+                    sidecar.record_key(key_id, str(self.file_keys.wrapped[key_id]))
+                if sidecar:
+                    sidecar.record(
+                        self.node_id(node_coordinate),
+                        value_digest(self._config.rule_recipients(rule), decrypted),
+                        encrypted,
+                    )
+                self.set_decrypted(node_coordinate, YamlCryptNode.from_string(decrypted))
+                self.replaced.append((node_coordinate.parent, node_coordinate.parentref))
+            else:
+                self.stats.count("values_skipped")
+        return self.store_file_keys() or should_dump
 
-        def post_process(data):
-            return data.replace("\\n", "")
+    def get(self, yaml_path):
+        """Return the values of the nodes matching yaml_path, decrypted.
 
-        if should_dump:
-            self.dump(post_process=post_process)
+        Only the values matching yaml_path, or inside the collections matching it, are
+        decrypted. Values inside collections are replaced by their plaintext in place.
+        """
+        from yamlpath import YAMLPath
+        from yamlpath.exceptions import YAMLPathException
 
-    def dump(self, post_process=None):
-        path = self._args.output or self._args.input
+        try:
+            requested = list(self.processor.get_nodes(YAMLPath(yaml_path), mustexist=True))
+        except YAMLPathException:
+            return []
+        scalars = {
+            (id(node.parent), node.parentref)
+            for node in requested
+            if not isinstance(node.node, dict | list)
+        }
+        collections = {id(node.node) for node in requested if isinstance(node.node, dict | list)}
+        decrypted = {}
+        for rule, node_coordinate in self.__iterate_nodes():
+            key = (id(node_coordinate.parent), node_coordinate.parentref)
+            inside = any(id(parent) in collections for parent, _ in node_coordinate.ancestry)
+            if key not in scalars and not inside:
+                continue
+            encrypted = self.encrypted_data(rule, node_coordinate.node)
+            if encrypted is None:
+                continue
+            node = YamlCryptNode.from_string(self.decrypt_data(rule, encrypted))
+            if inside:
+                # Unlike decrypt, the collection is not dumped with the raw text of quoted values
+                self.set_decrypted(node_coordinate, node, raw=False)
+            decrypted[key] = node.to_value()
+        return [decrypted.get((id(node.parent), node.parentref), node.node) for node in requested]
+
+    def export(self):
+        """Yield the path and plaintext of each scalar matched by a rule.
+
+        Scalars which are not strings are exported as their YAML text, true or 12 for example.
+        """
+        for rule, node_coordinate in self.__iterate_nodes():
+            encrypted = self.encrypted_data(rule, node_coordinate.node)
+            if encrypted is not None:
+                node = YamlCryptNode.from_string(self.decrypt_data(rule, encrypted))
+                yield str(node_coordinate.path), node.to_value()
+                continue
+            self.stats.count("values_skipped")
+            if isinstance(node_coordinate.node, str):
+                yield str(node_coordinate.path), str(node_coordinate.node)
+            elif not isinstance(node_coordinate.node, dict | list | AbstractSet):
+                text = get_yaml().dump_to_string(node_coordinate.node).removesuffix("\n...")
+                yield str(node_coordinate.path), text
 
+    def store_file_keys(self):
+        if self.file_keys.store():
+            # The document structure changed, it can only be dumped
+            self.replaced.append((self.yaml_data, FILE_KEYS_FIELD))
+            return True
+        return False
+
+    def dump(self, post_process=None):
         def strip_document_end_marker(s):
             if not self.yaml.explicit_end and s.endswith("...\n"):
                 return s[:-4]
@@ -120,5 +565,276 @@ class YamlCryptProcessor:
         ret = yaml.dump_to_string(self.yaml_data, add_final_eol=True)
         if post_process:
             ret = strip_document_end_marker(post_process(ret))
+        return ret
+
+    def span(self, parent, key):
+        """Return the offsets of the raw text of a value, None when it cannot be located."""
+        if not isinstance(parent, CommentedMap) or parent.fa.flow_style():
+            return None
+        if key not in parent or key not in parent.lc.data:
+            return None
+        comment = parent.ca.items.get(key)
+        if comment and comment[2] and comment[2].value.startswith("#"):
+            # The end of line comment would be lost with the value
+            return None
+
+        lines = self.source.newline_lines
+        key_col = parent.lc.key(key)[1]
+        val_line, val_col = parent.lc.value(key)
+        if val_line != parent.lc.key(key)[0]:
+            return None
+        next_line = self.source.next_line(SimpleNamespace(ancestry=[(parent, key)]))
+        if next_line is None:
+            next_line = len(lines)
+        indicator = lines[val_line][val_col : val_col + 1]
+        if indicator in ("&", "!", "*"):
+            # Anchors, tags and aliases are not kept by the rendering of the value
+            return None
+        if indicator in ("|", ">") and "+" in lines[val_line][val_col:].split()[0]:
+            # The trailing empty lines of kept block scalars are part of the value
+            return None
+        end_line = val_line
+        # Other lines of the value are indented more than its key, comments only end plain scalars
+        for line_number in range(val_line + 1, next_line):
+            line = lines[line_number].removesuffix("\r").lstrip(" ")
+            if line and len(lines[line_number]) - len(line) > key_col:
+                if indicator in ("|", ">", '"', "'") or not line.startswith("#"):
+                    end_line = line_number
+        offsets = self.source.line_offsets
+        # The carriage return of CRLF line endings is kept with the text after the value
+        return (
+            offsets[val_line] + val_col,
+            offsets[end_line] + len(lines[end_line].removesuffix("\r")),
+            key_col,
+            val_col,
+        )
+
+    @staticmethod
+    def render(yaml, value, key_col, val_col):
+        """Render a value to be written at the position of the value it replaces."""
+        # A key of the same length at the same indent folds long lines as a full dump would
+        key = "k" * (val_col - key_col - 2)
+        yaml.width = DUMP_WIDTH - key_col
+        rendered = yaml.dump_to_string({key: value}, add_final_eol=True)
+        if not rendered.startswith(f"{key}: ") or rendered.endswith(("\n\n", "\n...\n")):
+            # Trailing empty lines of kept block scalars would be mixed with the text after them
+            return None
+        lines = rendered[len(key) + 2 : -1].split("\n")
+        return "\n".join(
+            [lines[0]] + [" " * key_col + line if line else line for line in lines[1:]]
+        )
+
+    def splice(self, post_process=None):
+        """Write the replaced values in the original text, None when it is not possible.
+
+        Unlike dump, the text around the replaced values is kept byte identical, and the
+        replaced values are written with the line endings of the text.
+        """
+        if self.source is None or any(char in self.source.text for char in "\x85\u2028\u2029"):
+            return None
+        newline = "\n"
+        if "\r" in self.source.text:
+            crlf = self.source.text.count("\r\n")
+            if crlf != self.source.text.count("\r") or crlf != self.source.text.count("\n"):
+                # Mixed line endings, a value could not be written with the ones around it
+                return None
+            newline = "\r\n"
+        yaml = YAML(typ=["rt", "string"])
+        replacements = []
+        for parent, key in self.replaced:
+            span = self.span(parent, key)
+            rendered = span and self.render(yaml, parent[key], *span[2:])
+            if rendered is None:
+                return None
+            if post_process:
+                rendered = post_process(rendered)
+            replacements.append((span[0], span[1], rendered.replace("\n", newline)))
+
+        text = self.source.text
+        ret = []
+        position = 0
+        for start, end, rendered in sorted(replacements):
+            if start < position:
+                return None
+            ret += [text[position:start], rendered]
+            position = end
+        ret.append(text[position:])
+        return "".join(ret)
+
 
-        path.write_text(ret)
+def decrypt_post_process(data):
+    return data.replace("\\n", "")
+
+
+class YamlCryptProcessor:
+    def __init__(self, args: YamlCryptProcessorArgs, config: YamlCryptConfig, log=None):
+        self._args = args
+        self._config = config
+        self._log = log or logger()
+        # File scoped rules apply to any content read from stdin without a path
+        self.rules = list(config.iterate_rules(path=args.rules_path))
+        self.matcher = YamlCryptMatcher(self.rules)
+        self.stats = YamlCryptStats(path=str(args.input))
+        # Set by from_string and from_data, which do not read or write any file
+        self._in_memory = False
+        self._data = None
+
+    @classmethod
+    def from_string(cls, text, config, path=None, splice=False, log=None):
+        """Return a processor of YAML text, encrypt and decrypt return the processed text.
+
+        path is only used to select the file scoped rules.
+        """
+        if isinstance(text, bytes):
+            text = text.decode("utf-8")
+        args = YamlCryptProcessorArgs(
+            input=STDIO,
+            splice=splice,
+            stdin=io.StringIO(text),
+            stdout=io.StringIO(),
+            stdin_path=path,
+        )
+        processor = cls(args=args, config=config, log=log)
+        processor._in_memory = True
+        return processor
+
+    @classmethod
+    def from_data(cls, data, config, path=None, log=None):
+        """Return a processor of a document parsed by ruamel.yaml, modified in place.
+
+        encrypt and decrypt return the modified document. Quoted scalars are encrypted with
+        the escape sequences they would be written with, as values encrypted from a file, and
+        decrypted to their value.
+        """
+        processor = cls(
+            args=YamlCryptProcessorArgs(input=STDIO, stdin_path=path), config=config, log=log
+        )
+        processor._in_memory = True
+        processor._data = data
+        return processor
+
+    def documents(self, skip=True):
+        """Iterate over the documents of the input, reading each one only when needed.
+
+        Unless skip is False, documents no rule can match are not parsed.
+        """
+        if self._data is not None:
+            yield YamlCryptDocument(
+                None,
+                0,
+                self.rules,
+                self._config,
+                self._log,
+                matcher=self.matcher,
+                data=self._data,
+                stats=self.stats,
+            )
+            return
+        lines = read_lines(self._args.input, stdin=self._args.stdin)
+        texts = self.stats.iterate("read", iterate_documents(lines))
+        for index, text in enumerate(texts):
+            self.stats.count("documents")
+            self.stats.count("bytes_in", len(text.encode("utf-8")))
+            try:
+                with self.stats.phase("load"):
+                    document = YamlCryptDocument(
+                        text,
+                        index,
+                        self.rules,
+                        self._config,
+                        self._log,
+                        matcher=self.matcher,
+                        stats=self.stats,
+                        skip=skip,
+                    )
+            except YamlCryptError as error:
+                raise YamlCryptError("Could not load input file", str(self._args.input)) from error
+            yield document
+
+    def output(self):
+        return YamlCryptOutput(
+            self._args.output_path,
+            stdout=self._args.stdout,
+            fsync=self._args.fsync,
+            stats=self.stats,
+        )
+
+    def sidecar(self, path):
+        if self._config.sidecar and path != STDIO:
+            return YamlCryptSidecar(sidecar_path(path)).load()
+        return None
+
+    def write_document(self, output, document, post_process=None):
+        with self.stats.phase("dump"):
+            data = None
+            if self._args.splice:
+                data = document.splice(post_process=post_process)
+            if data is None:
+                data = document.dump(post_process=post_process)
+        output.write(data, changed=True)
+
+    def result(self):
+        """Return the processed document or text of an in memory processor."""
+        if self._data is not None:
+            return self._data
+        if self._in_memory:
+            return self._args.stdout.getvalue()
+        return None
+
+    def encrypt(self):
+        if self._data is not None:
+            for document in self.documents():
+                document.encrypt()
+            return self.result()
+        sidecar = self.sidecar(self._args.input)
+        with self.output() as output:
+            for document in self.documents():
+                if document.encrypt(sidecar):
+                    self.write_document(output, document)
+                else:
+                    # Documents without changes are kept byte identical
+                    output.write(document.source.text)
+        if sidecar:
+            sidecar.remove()
+        return self.result()
+
+    def get(self, yaml_path):
+        """Return the values of the nodes matching yaml_path in every document, decrypted.
+
+        Only the matching values are decrypted, nothing is written.
+        """
+        return [
+            value for document in self.documents(skip=False) for value in document.get(yaml_path)
+        ]
+
+    def export(self):
+        """Return the plaintext values matched by the rules by path, nothing is written.
+
+        A path found in several documents is an error.
+        """
+        from yamlcrypt.export import add_values
+
+        values = {}
+        for document in self.documents():
+            add_values(values, document.export())
+        return values
+
+    def check(self):
+        """Return the nodes matched by a rule which are not encrypted."""
+        return [node for document in self.documents() for node in document.check()]
+
+    def decrypt(self):
+        if self._data is not None:
+            for document in self.documents():
+                document.decrypt()
+            return self.result()
+        sidecar = self.sidecar(self._args.output_path)
+        with self.output() as output:
+            for document in self.documents():
+                if document.decrypt(sidecar):
+                    self.write_document(output, document, post_process=decrypt_post_process)
+                else:
+                    output.write(document.source.text)
+        if sidecar:
+            sidecar.save()
+        return self.result()
@@ -0,0 +1,130 @@
+import io
+import json
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+
+from yamlcrypt.client import PROTOCOL_VERSION, absolute, is_private_directory
+from yamlcrypt.config import YamlCryptConfig
+from yamlcrypt.errors import YamlCryptError
+from yamlcrypt.logger import DelayedLogger, logger
+from yamlcrypt.output import FSYNC_FILE
+from yamlcrypt.processor import YamlCryptProcessor, YamlCryptProcessorArgs
+from yamlcrypt.source import STDIO
+from yamlcrypt.version import __version__
+
+COMMANDS = ("encrypt", "decrypt", "check", "export")
+
+
+def error_to_response(error):
+    if not isinstance(error, YamlCryptError):
+        error = YamlCryptError("Unexpected error in the daemon", repr(error))
+    return {"type": type(error).__name__, "args": [str(arg) for arg in error.args]}
+
+
+class YamlCryptRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.handle_request_data(json.loads(line))
+            except (ValueError, YamlCryptError) as error:
+                response = {"messages": [], "error": error_to_response(error)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class YamlCryptServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Process the commands sent by clients with a config, rules and keys loaded once.
+
+    The config file is loaded again when it changes. Files are read and written by the daemon
+    itself, so clients send absolute paths.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, config_path, log=None):
+        self.socket_path = Path(socket_path)
+        self.config_path = Path(config_path).absolute()
+        self.log = log or logger()
+        self._config = None
+        self._config_mtime = None
+        self._lock = threading.Lock()
+        self.socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if not is_private_directory(self.socket_path.parent):
+            # Another user could replace the socket and receive the values sent to the daemon
+            raise YamlCryptError(
+                "The socket directory should be owned by the user with mode 0700",
+                str(self.socket_path.parent),
+            )
+        self.remove_stale_socket()
+        # Only the user running the daemon may use its keys
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(self.socket_path), YamlCryptRequestHandler)
+        finally:
+            os.umask(umask)
+
+    def remove_stale_socket(self):
+        if not self.socket_path.is_socket():
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            try:
+                client.connect(str(self.socket_path))
+            except OSError:
+                self.socket_path.unlink()
+                return
+        raise YamlCryptError("A daemon is already listening on", str(self.socket_path))
+
+    def server_close(self):
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+    @property
+    def config(self):
+        with self._lock:
+            mtime = self.config_path.stat().st_mtime_ns
+            if self._config is None or mtime != self._config_mtime:
+                self.log.verbose(f"Loading config {self.config_path}")
+                config = YamlCryptConfig(self.log).load(path=self.config_path)
+                config.preload_keys()
+                self._config, self._config_mtime = config, mtime
+            return self._config
+
+    def handle_request_data(self, request):
+        if not isinstance(request, dict):
+            raise YamlCryptError("Invalid request", repr(request))
+        if request.get("v") != PROTOCOL_VERSION:
+            raise YamlCryptError("Unsupported protocol version", request.get("v"))
+        command = request.get("command")
+        if command == "hello":
+            return {"version": __version__, "config": absolute(self.config_path)}
+        if command not in COMMANDS:
+            raise YamlCryptError("Unknown command", command)
+        if not isinstance(request.get("input"), str) or not request["input"]:
+            raise YamlCryptError("Missing input in request", command)
+
+        log = DelayedLogger(logger())
+        stdout = io.StringIO()
+        args = YamlCryptProcessorArgs(
+            input=Path(request["input"]),
+            output=Path(request["output"]) if request.get("output") else None,
+            stdin=io.StringIO(request.get("data") or ""),
+            stdout=stdout,
+            splice=request.get("splice", False),
+            fsync=request.get("fsync") or FSYNC_FILE,
+        )
+        response = {"messages": [], "result": None, "error": None, "data": None, "stats": None}
+        processor = None
+        try:
+            processor = YamlCryptProcessor(args=args, config=self.config, log=log)
+            response["result"] = getattr(processor, command)()
+        except Exception as error:
+            response["error"] = error_to_response(error)
+        response["messages"] = log.records()
+        if processor:
+            response["stats"] = processor.stats.to_dict()
+        if args.output_path == STDIO:
+            response["data"] = stdout.getvalue()
+        return response
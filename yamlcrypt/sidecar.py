@@ -0,0 +1,67 @@
+import hashlib
+import hmac
+import json
+
+SIDECAR_VERSION = 1
+
+
+def sidecar_path(path):
+    return path.with_name(f".{path.name}.yamlcrypt")
+
+
+def value_digest(recipients, value):
+    # The hash key only depends on the recipients so any user able to encrypt can reuse values
+    key = hashlib.sha256(
+        "\n".join(
+            ["yamlcrypt-sidecar", *sorted(str(recipient) for recipient in recipients)]
+        ).encode("utf-8")
+    ).digest()
+    return hmac.new(key, value.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class YamlCryptSidecar:
+    """Ciphertexts of the decrypted values of a file, indexed by path and plaintext hash.
+
+    Written next to the decrypted file, it allows encrypt to reuse the previous ciphertext of
+    the values that did not change, keeping the encrypted file diff minimal.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.values = {}
+        self.keys = {}
+
+    def load(self):
+        if self.path.is_file():
+            data = json.loads(self.path.read_text())
+            if data.get("version") == SIDECAR_VERSION:
+                self.values = data.get("values", {})
+                self.keys = data.get("keys", {})
+        return self
+
+    def save(self):
+        if not self.values:
+            self.remove()
+            return
+        self.path.write_text(
+            json.dumps(
+                {"version": SIDECAR_VERSION, "values": self.values, "keys": self.keys},
+                indent=2,
+                sort_keys=True,
+            )
+        )
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+    def record(self, yaml_path, digest, encrypted):
+        self.values[yaml_path] = {"hmac": digest, "value": encrypted}
+
+    def record_key(self, key_id, wrapped):
+        self.keys[key_id] = wrapped
+
+    def lookup(self, yaml_path, digest):
+        entry = self.values.get(yaml_path)
+        if entry and hmac.compare_digest(entry["hmac"], digest):
+            return entry["value"]
+        return None
@@ -0,0 +1,137 @@
+import sys
+from functools import cached_property
+from pathlib import Path
+
+# The path used on the command line for stdin and stdout
+STDIO = Path("-")
+
+
+def read_lines(path, stdin=None):
+    """Iterate over the lines of a file, with the same newline handling as Path.read_text."""
+    if path == STDIO:
+        yield from stdin or sys.stdin
+        return
+    with path.open(encoding="utf-8") as f:
+        yield from f
+
+
+def is_marker(line, marker):
+    return line.startswith(marker) and (len(line) == 3 or line[3] in " \t\r\n")
+
+
+def iterate_documents(lines):
+    """Split a YAML stream in the raw text of its documents, as the lines are read.
+
+    Document markers at the start of a line cannot appear inside a document, so the
+    stream can be split without parsing it. Comments and directives preceding a
+    document start marker are kept with the document they precede.
+    """
+    document = []
+    started = False
+    ended = False
+    for line in lines:
+        content = line.strip() and not line.lstrip().startswith("#")
+        if is_marker(line, "---"):
+            if started:
+                yield "".join(document)
+                document = []
+            started = True
+            ended = False
+        elif line.startswith("%"):
+            if started:
+                yield "".join(document)
+                document = []
+            started = False
+            ended = False
+        elif is_marker(line, "..."):
+            ended = True
+        elif content and ended:
+            # Bare document following a document end marker
+            yield "".join(document)
+            document = []
+            ended = False
+        elif content:
+            started = True
+        document.append(line)
+    if document:
+        yield "".join(document)
+
+
+class YamlCryptSource:
+    """The raw text of a document, used to recover scalars as they were written."""
+
+    def __init__(self, text):
+        self.text = text
+        self._next_keys = {}
+
+    @cached_property
+    def lines(self):
+        # Only computed when a scalar needs to be recovered from the raw text
+        return self.text.splitlines()
+
+    @cached_property
+    def newline_lines(self):
+        """The lines of the text split on newlines only, as counted by the YAML parser."""
+        return self.text.split("\n")
+
+    @cached_property
+    def line_offsets(self):
+        """Offset in the text of the start of each line, as counted by the YAML parser."""
+        offsets = [0]
+        for line in self.newline_lines:
+            offsets.append(offsets[-1] + len(line) + 1)
+        return offsets
+
+    @property
+    def explicit_start(self):
+        return any(is_marker(line, "---") for line in self.text.splitlines())
+
+    @property
+    def explicit_end(self):
+        return self.text.rstrip().rpartition("\n")[2].startswith("...")
+
+    def quoted_end(self, line, column):
+        """Return the line and column of the closing quote of the scalar starting there.
+
+        None when the scalar is not closed, which the parser would have rejected.
+        """
+        lines = self.lines
+        quote = lines[line][column]
+        index = column + 1
+        while line < len(lines):
+            text = lines[line]
+            while index < len(text):
+                char = text[index]
+                if char == "\\" and quote == '"':
+                    index += 2
+                    continue
+                if char == quote:
+                    if quote == "'" and text.startswith("'", index + 1):
+                        # Escaped single quote
+                        index += 2
+                        continue
+                    return line, index
+                index += 1
+            line += 1
+            index = 0
+        return None
+
+    def next_key(self, parent, key):
+        """Return the key following key in the parent collection, None for the last one."""
+        if isinstance(parent, list):
+            return key + 1 if key + 1 < len(parent) else None
+        # Key order is indexed once per mapping, values are replaced in place so it stays valid
+        if id(parent) not in self._next_keys:
+            keys = list(parent.keys())
+            self._next_keys[id(parent)] = (parent, dict(zip(keys, keys[1:], strict=False)))
+        return self._next_keys[id(parent)][1].get(key)
+
+    def next_line(self, node_coordinate):
+        """Return the line of the first node following node_coordinate, None if it is the last."""
+        for parent, parentref in reversed(node_coordinate.ancestry):
+            next_key = self.next_key(parent, parentref)
+            if next_key is not None:
+                if isinstance(parent, list):
+                    return parent.lc.item(next_key)[0]
+                return parent.lc.key(next_key)[0]
+        return None
@@ -0,0 +1,84 @@
+import json
+import time
+from contextlib import contextmanager
+
+STATS_HUMAN = "human"
+STATS_JSON = "json"
+STATS_FORMATS = (STATS_HUMAN, STATS_JSON)
+
+# Reading the input, parsing documents, matching the rules, encrypting or decrypting values,
+# rendering the changed documents and writing them
+PHASES = ("read", "load", "match", "crypto", "dump", "write")
+COUNTERS = (
+    "documents",
+    "nodes_matched",
+    "values_encrypted",
+    "values_decrypted",
+    "values_skipped",
+    "bytes_in",
+    "bytes_out",
+)
+
+
+class YamlCryptStats:
+    """Counters and time spent in each phase of the processing of an input."""
+
+    def __init__(self, path=None, counters=None, timers=None):
+        self.path = path
+        self.counters = dict.fromkeys(COUNTERS, 0) | (counters or {})
+        self.timers = dict.fromkeys(PHASES, 0.0) | (timers or {})
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(path=data["path"], counters=data["counters"], timers=data["timers"])
+
+    @classmethod
+    def total(cls, stats):
+        total = cls(path="total")
+        for item in stats:
+            for name, value in item.counters.items():
+                total.counters[name] = total.counters.get(name, 0) + value
+            for name, value in item.timers.items():
+                total.timers[name] = total.timers.get(name, 0.0) + value
+        return total
+
+    def to_dict(self):
+        return {"path": self.path, "counters": self.counters, "timers": self.timers}
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def iterate(self, name, iterable):
+        """Iterate over a lazy iterable, only timing the production of its items."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+
+def format_stats(stats, fmt=STATS_HUMAN, extra=None):
+    """Format the stats of each input followed by their total."""
+    total = YamlCryptStats.total(stats)
+    if fmt == STATS_JSON:
+        return json.dumps(
+            {"files": [item.to_dict() for item in stats], "total": total.to_dict(), **(extra or {})}
+        )
+    lines = []
+    for item in [*stats, total]:
+        counters = " ".join(f"{name}={value}" for name, value in item.counters.items())
+        timers = " ".join(f"{name}={value * 1000:.1f}ms" for name, value in item.timers.items())
+        lines.append(f"{item.path}: {counters} {timers}")
+    lines += [f"{name}: {value}" for name, value in (extra or {}).items()]
+    return "\n".join(lines)
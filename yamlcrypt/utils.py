@@ -0,0 +1,44 @@
+import sys
+import warnings
+from pathlib import Path
+
+
+def split_string_at_width(text, width=80):
+    return "\n".join(text[i : i + width] for i in range(0, len(text), width))
+
+
+def yaml_editor():
+    """Return a round trip YAML instance, configured as yamlpath configures its editor."""
+    # Imported when needed, the CLI imports this module
+    from ruamel.yaml import YAML
+
+    yaml = YAML()
+    yaml.indent(mapping=2, sequence=4, offset=2)
+    yaml.explicit_start = True
+    yaml.preserve_quotes = True
+    yaml.width = sys.maxsize
+    return yaml
+
+
+def load_yaml(yaml, log, source):
+    """Parse YAML text, or the file at the source path.
+
+    Return the data and whether it could be loaded, errors are logged as yamlpath logs them.
+    Warnings of the parser, like reused anchors, are errors.
+    """
+    from ruamel.yaml.error import MarkedYAMLError, YAMLError, YAMLFutureWarning, YAMLWarning
+
+    try:
+        with warnings.catch_warnings():
+            warnings.filterwarnings("error")
+            if isinstance(source, Path):
+                with source.open(encoding="utf-8") as f:
+                    return yaml.load(f), True
+            return yaml.load(source), True
+    except FileNotFoundError:
+        log.error(f"File not found:  {source}")
+    except MarkedYAMLError as error:
+        log.error(f"YAML error {str(error.problem_mark).lstrip()}:  {error.problem}")
+    except (YAMLError, YAMLWarning, YAMLFutureWarning) as error:
+        log.error(f"YAML error:  {str(error).strip()}")
+    return None, False
@@ -0,0 +1,10 @@
+try:
+    # Written by setuptools_scm when the package is built
+    from yamlcrypt.__version__ import version as __version__
+except ImportError:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        __version__ = version("yamlcrypt")
+    except PackageNotFoundError:
+        __version__ = "dev"
@@ -0,0 +1,191 @@
+import os
+import re
+from pathlib import Path, PurePosixPath
+
+DEFAULT_INCLUDE = ("*.yaml", "*.yml")
+GITIGNORE = ".gitignore"
+
+
+def translate_pattern(pattern):
+    """Translate a gitignore pattern, without negation and trailing slash, to a regex."""
+    # Patterns with a slash other than a trailing one are relative to the .gitignore directory
+    anchored = "/" in pattern
+    pattern = pattern.removeprefix("/")
+    regex = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**/", index):
+            regex.append("(?:.*/)?")
+            index += 3
+            continue
+        if pattern.startswith("**", index) and index + 2 == len(pattern):
+            regex.append(".*")
+            index += 2
+            continue
+        if char == "*":
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[" and "]" in pattern[index + 2 :]:
+            end = pattern.index("]", index + 2)
+            content = pattern[index + 1 : end].replace("\\", "\\\\")
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            regex.append(f"[{content}]")
+            index = end
+        elif char == "\\" and index + 1 < len(pattern):
+            index += 1
+            regex.append(re.escape(pattern[index]))
+        else:
+            regex.append(re.escape(char))
+        index += 1
+    if not anchored:
+        regex.insert(0, "(?:.*/)?")
+    return re.compile("".join(regex))
+
+
+class YamlCryptIgnoreFile:
+    """The patterns of a .gitignore file, relative to its directory."""
+
+    def __init__(self, base, lines):
+        self.base = base
+        self.patterns = []
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.endswith("\\ "):
+                line = line.rstrip(" ")
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            line = line[1:] if negate else line
+            directory_only = line.endswith("/")
+            self.patterns.append((translate_pattern(line.rstrip("/")), negate, directory_only))
+
+    @classmethod
+    def load(cls, path, base=None):
+        try:
+            with path.open(encoding="utf-8", errors="replace") as f:
+                return cls(base or path.parent, f.readlines())
+        except OSError:
+            return None
+
+    def match(self, path, is_dir):
+        """Return whether path is ignored, None when no pattern matches it."""
+        relative = path.relative_to(self.base).as_posix()
+        # The last matching pattern wins
+        for regex, negate, directory_only in reversed(self.patterns):
+            if directory_only and not is_dir:
+                continue
+            if regex.fullmatch(relative):
+                return not negate
+        return None
+
+
+def is_ignored(ignore_files, path, is_dir):
+    # Patterns of deeper .gitignore files override the ones of their parents
+    for ignore_file in reversed(ignore_files):
+        ignored = ignore_file.match(path, is_dir)
+        if ignored is not None:
+            return ignored
+    return False
+
+
+def parent_ignore_files(root):
+    """Load the .gitignore files of the parents of root, up to the root of its repository.
+
+    The .gitignore file of root itself is loaded when it is scanned.
+    """
+    parents = []
+    for parent in [root, *root.parents]:
+        parents.append(parent)
+        if (parent / ".git").exists():
+            break
+    else:
+        # Outside of a repository, the .gitignore files of the parents do not apply
+        return ()
+    ignore_files = []
+    for parent in reversed(parents[1:]):
+        ignore_file = YamlCryptIgnoreFile.load(parent / GITIGNORE)
+        if ignore_file:
+            ignore_files.append(ignore_file)
+    exclude = YamlCryptIgnoreFile.load(parents[-1] / ".git" / "info" / "exclude", parents[-1])
+    if exclude:
+        ignore_files.insert(0, exclude)
+    return tuple(ignore_files)
+
+
+class YamlCryptWalker:
+    """Find the files to process below directories, scanning directories concurrently.
+
+    Files are yielded in path order as soon as the directories before them are scanned, so
+    they can be processed while the other directories are scanned.
+    """
+
+    def __init__(self, include=DEFAULT_INCLUDE, exclude=(), gitignore=True, workers=None):
+        self.include = tuple(include) or DEFAULT_INCLUDE
+        self.exclude = tuple(exclude)
+        self.gitignore = gitignore
+        self.workers = workers
+
+    @staticmethod
+    def matches(relative, patterns):
+        # Relative patterns are matched from the right, as the files of the rules
+        return any(relative.match(pattern) for pattern in patterns)
+
+    def scan(self, executor, root, directory, ignore_files):
+        """Return the entries of a directory in name order.
+
+        Entries are the paths of the files to process, and the futures of the scans of the
+        subdirectories, submitted right away.
+        """
+        if self.gitignore:
+            ignore_file = YamlCryptIgnoreFile.load(directory / GITIGNORE)
+            if ignore_file:
+                ignore_files = (*ignore_files, ignore_file)
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        result = []
+        for entry in entries:
+            path = directory / entry.name
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if is_dir and entry.name == ".git":
+                continue
+            relative = PurePosixPath(path.relative_to(root).as_posix())
+            if self.matches(relative, self.exclude):
+                continue
+            if self.gitignore and is_ignored(ignore_files, path, is_dir):
+                continue
+            if is_dir:
+                result.append(executor.submit(self.scan, executor, root, path, ignore_files))
+            elif entry.is_file() and self.matches(relative, self.include):
+                result.append(path)
+        return result
+
+    def walk(self, root):
+        """Yield the files below root matching the include patterns, in path order."""
+        # Only imported when walking, the CLI imports this module for its defaults
+        from concurrent.futures import ThreadPoolExecutor
+
+        root = Path(root)
+        # Directories are scanned with absolute paths, to match the parent .gitignore files
+        absolute = root.absolute()
+        ignore_files = parent_ignore_files(absolute) if self.gitignore else ()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                # Depth first, the entries of each directory are sorted by name
+                stack = [
+                    iter([executor.submit(self.scan, executor, absolute, absolute, ignore_files)])
+                ]
+                while stack:
+                    entry = next(stack[-1], None)
+                    if entry is None:
+                        stack.pop()
+                    elif isinstance(entry, Path):
+                        yield root / entry.relative_to(absolute)
+                    else:
+                        # Errors of the scan are raised in the thread consuming the files
+                        stack.append(iter(entry.result()))
+            finally:
+                # Directories not scanned yet are abandoned when the walk is interrupted
+                executor.shutdown(wait=True, cancel_futures=True)
@@ -1,43 +1,398 @@
-from yamlcrypt.config import YamlCryptConfig
+import os
+import signal
+import sys
+from collections import deque
+from contextlib import contextmanager
+
+from yamlcrypt.client import YamlCryptClient
 from yamlcrypt.errors import YamlCryptConfigNotFoundError, YamlCryptError
-from yamlcrypt.logger import logger
-from yamlcrypt.processor import YamlCryptProcessor, YamlCryptProcessorArgs
+from yamlcrypt.logger import DelayedLogger, logger
+from yamlcrypt.output import FSYNC_FILE
+from yamlcrypt.source import STDIO
+from yamlcrypt.stats import STATS_HUMAN, YamlCryptStats, format_stats
+from yamlcrypt.version import __version__
+
+# The config, processor and server modules import ruamel.yaml, yamlpath and pyrage, they are
+# imported by the methods which need them so commands sent to a daemon start faster.
+
+# Files submitted to each worker ahead of the reported results, to keep the workers busy
+MAX_PENDING_PER_JOB = 2
+
+_worker_config = None
+
+
+def _init_worker(config):
+    global _worker_config
+    _worker_config = config
+
+
+def _run_worker(command, args):
+    from yamlcrypt.processor import YamlCryptProcessor
+
+    log = DelayedLogger(logger())
+    processor = None
+    try:
+        processor = YamlCryptProcessor(args=args, config=_worker_config, log=log)
+        result = getattr(processor, command)()
+    except Exception as error:
+        return log.messages, None, error, processor and processor.stats
+    return log.messages, result, None, processor.stats
 
 
 class YamlCrypt:
     def __init__(self, args):
         self.args = args
-        self.log = logger()
+        self._log = None
         self._config = None
-        if self.args.output and len(self.args.input) != 1:
+        # Stats of each processed input, in input order
+        self.stats = []
+        if getattr(self.args, "output", None) and len(self.args.input) != 1:
             raise YamlCryptError("When --output is used, input should have exactly one argument.")
+        if getattr(self.args, "output", None) and getattr(self.args, "recursive", False):
+            raise YamlCryptError("When --output is used, input cannot be a directory.")
+
+    @property
+    def log(self):
+        if not self._log:
+            self._log = logger()
+        return self._log
 
     @property
     def config(self):
+        from yamlcrypt.config import YamlCryptConfig
+
         if not self._config:
             self._config = YamlCryptConfig(self.log).load(path=self.args.config)
         return self._config
 
-    def processors(self):
+    @property
+    def profiling(self):
+        return bool(
+            getattr(self.args, "profile", None) or getattr(self.args, "trace_memory", False)
+        )
+
+    def inputs(self):
+        """Return the inputs, with the files found in the directories when recursive.
+
+        Files found in directories are yielded in path order as they are found, so they are
+        processed while the other directories are walked.
+        """
+        if not getattr(self.args, "recursive", False):
+            return list(self.args.input)
+        return self.walk()
+
+    def walk(self):
+        from yamlcrypt.walker import YamlCryptWalker
+
+        walker = YamlCryptWalker(
+            include=getattr(self.args, "include", None) or (),
+            exclude=getattr(self.args, "exclude", None) or (),
+            gitignore=not getattr(self.args, "no_gitignore", False),
+        )
         for input in self.args.input:
-            yield YamlCryptProcessor(
-                args=YamlCryptProcessorArgs(input=input, output=self.args.output),
-                config=self.config,
-            )
+            if input != STDIO and input.is_dir():
+                yield from walker.walk(input)
+            else:
+                yield input
+
+    def jobs(self, inputs):
+        if STDIO in self.args.input or self.profiling:
+            # Workers cannot share the standard streams of this process, nor be profiled by it
+            return 1
+        jobs = getattr(self.args, "jobs", None) or os.cpu_count() or 1
+        if isinstance(inputs, list):
+            return min(jobs, len(inputs))
+        # The number of files in the directories is not known before they are walked
+        return jobs
+
+    def options(self):
+        """Return the processor options shared by all inputs."""
+        return {
+            "output": getattr(self.args, "output", None),
+            "splice": getattr(self.args, "splice", False),
+            "fsync": getattr(self.args, "fsync", FSYNC_FILE),
+        }
+
+    def processor_args(self, inputs):
+        from yamlcrypt.processor import YamlCryptProcessorArgs
+
+        for input in inputs:
+            yield YamlCryptProcessorArgs(input=input, **self.options())
+
+    def processors(self, inputs):
+        from yamlcrypt.processor import YamlCryptProcessor
+
+        for args in self.processor_args(inputs):
+            yield args.input, YamlCryptProcessor(args=args, config=self.config)
+
+    def client(self):
+        """Return a client connected to a daemon serving this config, None if there is none."""
+        socket_path = getattr(self.args, "socket", None)
+        if not socket_path or getattr(self.args, "no_daemon", False) or self.profiling:
+            return None
+        client = YamlCryptClient(socket_path)
+        if not client.connect(config=self.args.config, version=__version__):
+            return None
+        return client
+
+    def run_client(self, client, command, inputs):
+        """Run the command on every input through the daemon.
+
+        The daemon processes the inputs one after the other, jobs does not apply to it.
+        """
+        results = []
+        try:
+            for input in inputs:
+                messages, result, error, stats = client.run(command, input, **self.options())
+                DelayedLogger.load(self.log, messages).dump()
+                if stats:
+                    self.stats.append(YamlCryptStats.from_dict(stats))
+                if error:
+                    raise error
+                results.append((input, result))
+        finally:
+            client.close()
+        return results
+
+    def run(self, command):
+        """Run the processor command on every input, return the inputs with their results.
+
+        Results are in input order, files found in directories in the order they were found.
+        """
+        extra = {}
+        try:
+            with self.profile(extra):
+                inputs = self.inputs()
+                manifest = self.manifest(command)
+                if manifest:
+                    return self.run_incremental(command, inputs, manifest)
+                return self.run_inputs(command, inputs)
+        finally:
+            self.report_stats(extra)
+
+    def manifest(self, command):
+        """Return the manifest of the incremental mode, None when it is not enabled."""
+        if not getattr(self.args, "incremental", False):
+            return None
+        from yamlcrypt.manifest import COMMAND_STATES, YamlCryptManifest, default_manifest_path
+
+        if command not in COMMAND_STATES:
+            # Commands which do not leave the files in a state always process them
+            return None
+
+        path = getattr(self.args, "manifest", None) or default_manifest_path(self.args.config)
+        return YamlCryptManifest(path, self.config.digest()).load()
+
+    def run_incremental(self, command, inputs, manifest):
+        """Only process the inputs which changed since the last run, and record their state."""
+        force = getattr(self.args, "force", False)
+        skipped = []
+
+        def tracked(input):
+            # Files written elsewhere or to stdout are always processed
+            return input != STDIO and not self.options()["output"]
+
+        def changed(inputs):
+            for input in inputs:
+                if tracked(input) and not force and manifest.unchanged(input, command):
+                    skipped.append(input)
+                else:
+                    yield input
+
+        results = self.run_inputs(
+            command, list(changed(inputs)) if isinstance(inputs, list) else changed(inputs)
+        )
+        for input, result in results:
+            if not tracked(input):
+                continue
+            if command == "check" and result:
+                manifest.forget(input)
+            else:
+                manifest.record(input, command)
+        manifest.save()
+        if skipped:
+            self.log.verbose(f"{len(skipped)} unchanged files skipped")
+        # Skipped files were already encrypted, or decrypted
+        return results + [(input, [] if command == "check" else None) for input in skipped]
+
+    def run_inputs(self, command, inputs):
+        client = self.client()
+        if client:
+            return self.run_client(client, command, inputs)
+        jobs = self.jobs(inputs)
+        if jobs <= 1:
+            results = []
+            for input, processor in self.processors(inputs):
+                try:
+                    results.append((input, getattr(processor, command)()))
+                finally:
+                    self.stats.append(processor.stats)
+            return results
+
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Keys are resolved once instead of in each worker
+        self.config.preload_keys(recipients=command == "encrypt", identities=command == "decrypt")
+        # Workers are not forked from this process, where the walker threads may be running
+        methods = multiprocessing.get_all_start_methods()
+        if "forkserver" in methods:
+            context = multiprocessing.get_context("forkserver")
+            # Imported once by the fork server, instead of by each worker
+            context.set_forkserver_preload(["yamlcrypt.processor"])
+        else:
+            context = multiprocessing.get_context("spawn")
+        results = []
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.config,),
+        ) as executor:
+            # Files are submitted as they are found, workers start with the first ones. At most
+            # MAX_PENDING_PER_JOB files per worker are submitted ahead of the reported results, so
+            # few files after a failing one are processed, unlike a serial run which stops there
+            pending = deque()
+            try:
+                for args in self.processor_args(inputs):
+                    pending.append((args.input, executor.submit(_run_worker, command, args)))
+                    if len(pending) >= MAX_PENDING_PER_JOB * jobs:
+                        results.append(self.worker_result(*pending.popleft()))
+                while pending:
+                    results.append(self.worker_result(*pending.popleft()))
+            finally:
+                # Files not started yet when an error is reported are not processed
+                for _, future in pending:
+                    future.cancel()
+        return results
+
+    def worker_result(self, input, future):
+        """Report the messages and stats of a file processed by a worker, return its result.
+
+        Results are reported in input order so the output matches a serial run.
+        """
+        messages, result, error, stats = future.result()
+        DelayedLogger(self.log, messages).dump()
+        if stats:
+            self.stats.append(stats)
+        if error:
+            raise error
+        return input, result
+
+    @contextmanager
+    def profile(self, extra):
+        """Profile the command with cProfile and trace its peak memory when requested.
+
+        The profile path and the peak memory are added to extra, reported with the stats.
+        """
+        profile_path = getattr(self.args, "profile", None)
+        trace_memory = getattr(self.args, "trace_memory", False)
+        profiler = None
+        if trace_memory:
+            import tracemalloc
+
+            tracemalloc.start()
+        if profile_path:
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(profile_path)
+                extra["profile"] = str(profile_path)
+            if trace_memory:
+                extra["peak_memory"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+    def report_stats(self, extra):
+        fmt = getattr(self.args, "stats", None)
+        if fmt or extra:
+            # Written to stderr, stdout may be the output of the command
+            print(format_stats(self.stats, fmt or STATS_HUMAN, extra=extra), file=sys.stderr)
 
     def encrypt(self):
-        for processor in self.processors():
-            processor.encrypt()
+        self.run("encrypt")
 
     def decrypt(self):
-        for processor in self.processors():
-            processor.decrypt()
+        self.run("decrypt")
+
+    def check(self):
+        failed = False
+        for input, unencrypted in self.run("check"):
+            for path in unencrypted:
+                failed = True
+                self.log.info(f"{input}: {path} is not encrypted")
+        return 1 if failed else 0
+
+    def export(self):
+        """Print the plaintext values matched by the rules as a dotenv file, a script or JSON.
+
+        A path found in several inputs is an error.
+        """
+        from yamlcrypt.export import EXPORT_DOTENV, add_values, format_export
+
+        values = {}
+        for _, result in self.run("export"):
+            add_values(values, result.items())
+        text = format_export(
+            values,
+            getattr(self.args, "format", None) or EXPORT_DOTENV,
+            prefix=getattr(self.args, "prefix", None) or "",
+        )
+        if text:
+            print(text)
+
+    def get(self):
+        """Print the decrypted values of the nodes matching the YAML paths, in path order.
+
+        Only the requested values are decrypted and the input is not rewritten.
+        """
+        from yamlcrypt.node import get_yaml
+        from yamlcrypt.processor import YamlCryptProcessor, YamlCryptProcessorArgs
+
+        processor = YamlCryptProcessor(
+            args=YamlCryptProcessorArgs(input=self.args.input), config=self.config, log=self.log
+        )
+        # Documents are read once, for all the paths
+        documents = list(processor.documents(skip=False))
+        for yaml_path in self.args.yaml_path:
+            values = [value for document in documents for value in document.get(yaml_path)]
+            if not values:
+                raise YamlCryptError("No value found at", yaml_path)
+            for value in values:
+                if isinstance(value, str):
+                    sys.stdout.write(value if value.endswith("\n") else f"{value}\n")
+                else:
+                    # Collections and other scalars are written as YAML
+                    text = get_yaml().dump_to_string(value).removesuffix("\n...")
+                    sys.stdout.write(f"{text}\n")
+
+    def serve(self):
+        from yamlcrypt.server import YamlCryptServer
+
+        server = YamlCryptServer(self.args.socket, self.args.config, log=self.log)
+        self.log.info(f"Listening on {self.args.socket}")
+        # Remove the socket when stopped by a service manager as well
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
 
     def recipient_add(self):
+        from yamlcrypt.config import YamlCryptConfig
+
         # Create config file without loading so we can catch the error
         self._config = YamlCryptConfig(log=self.log)
         try:
-            self.config.load(path=self.args.config)
+            # Rules may reference the recipient being added
+            self.config.load(path=self.args.config, check_recipients=False)
         except YamlCryptConfigNotFoundError:
             self.log.info(
                 f"Config file does not exist yet, it will be created ({self.args.config})"